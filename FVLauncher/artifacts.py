@@ -0,0 +1,79 @@
+import logging
+import os
+import shutil
+import threading
+from collections.abc import Callable
+from multiprocessing.queues import Queue
+from multiprocessing.synchronize import Event
+from typing import Any
+
+import downloads
+import fileutils
+
+logger = logging.getLogger(__name__)
+
+STORE_DIRECTORY = "artifacts"
+
+
+def get_artifact_path(minecraft_directory: str, sha512: str) -> str:
+    # The store lives next to the instances, so hardlinks stay on one volume
+    return os.path.join(minecraft_directory, STORE_DIRECTORY, sha512[:2], sha512)
+
+
+def place_artifact(artifact_path: str, target_path: str):
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    tmp_path = fileutils.get_tmp_path(target_path)
+    try:
+        os.link(artifact_path, tmp_path)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(artifact_path), tmp_path)
+        except OSError:
+            shutil.copyfile(artifact_path, tmp_path)
+    os.replace(tmp_path, target_path)
+
+
+def install_files(
+    files: list[dict[str, Any]],
+    minecraft_directory: str,
+    max_workers: int,
+    queue: Queue,
+    cancel_event: Event | threading.Event,
+    on_file_installed: Callable[[dict[str, Any]], None] | None = None,
+    priority: int = downloads.PRIORITY_USER,
+):
+    files_to_download = []
+    for file in files:
+        sha512 = (file.get("hashes") or {}).get("sha512")
+        if sha512 is None:
+            files_to_download.append(file)
+            continue
+        artifact_path = get_artifact_path(minecraft_directory, sha512)
+        if os.path.isfile(artifact_path):
+            place_artifact(artifact_path, file["path"])
+            logger.debug(f"Placed stored {sha512} at {file['path']}")
+            if on_file_installed is not None:
+                on_file_installed(file)
+        else:
+            os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+            files_to_download.append({
+                **file,
+                "path": artifact_path,
+                "target_path": file["path"],
+            })
+
+    def on_file_downloaded(file: dict[str, Any]):
+        if "target_path" in file:
+            place_artifact(file["path"], file["target_path"])
+            file = {**file, "path": file["target_path"]}
+        if on_file_installed is not None:
+            on_file_installed(file)
+
+    downloads.download_files(
+        files_to_download,
+        max_workers,
+        queue,
+        cancel_event,
+        on_file_downloaded,
+        priority,
+    )
@@ -0,0 +1,199 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from collections.abc import Iterable
+from contextlib import closing
+from typing import Any
+
+CATALOG_PATH = os.path.join("cache", "catalog.sqlite3")
+BUSY_TIMEOUT = 10
+
+schema_created = False
+
+
+def connect() -> sqlite3.Connection:
+    global schema_created
+    os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+    connection = sqlite3.connect(CATALOG_PATH, timeout=BUSY_TIMEOUT)
+    connection.row_factory = sqlite3.Row
+    if not schema_created:
+        # WAL lets the search window read while a projects window writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS projects (
+                project_id TEXT PRIMARY KEY,
+                slug TEXT,
+                title TEXT NOT NULL,
+                description TEXT NOT NULL,
+                project_type TEXT NOT NULL,
+                downloads INTEGER NOT NULL,
+                icon_url TEXT,
+                versions TEXT NOT NULL,
+                categories TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS projects_fts USING fts5(
+                title, slug, description, content='projects', content_rowid='rowid'
+            );
+            CREATE TRIGGER IF NOT EXISTS projects_ai AFTER INSERT ON projects BEGIN
+                INSERT INTO projects_fts(rowid, title, slug, description)
+                VALUES (new.rowid, new.title, new.slug, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS projects_ad AFTER DELETE ON projects BEGIN
+                INSERT INTO projects_fts(projects_fts, rowid, title, slug, description)
+                VALUES ('delete', old.rowid, old.title, old.slug, old.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS projects_au AFTER UPDATE ON projects BEGIN
+                INSERT INTO projects_fts(projects_fts, rowid, title, slug, description)
+                VALUES ('delete', old.rowid, old.title, old.slug, old.description);
+                INSERT INTO projects_fts(rowid, title, slug, description)
+                VALUES (new.rowid, new.title, new.slug, new.description);
+            END;
+            CREATE TABLE IF NOT EXISTS version_files (
+                sha512 TEXT PRIMARY KEY,
+                version TEXT NOT NULL
+            );
+        """)
+        schema_created = True
+    return connection
+
+
+def add_projects(projects: Iterable[dict[str, Any]]):
+    rows = []
+    for project in projects:
+        # Search hits and /projects responses describe the same project with
+        # different field names
+        if "project_id" in project:
+            versions = project["versions"]
+            categories = project["categories"]
+        else:
+            versions = project["game_versions"]
+            categories = project["categories"] + project["loaders"]
+        rows.append((
+            project.get("project_id", project.get("id")),
+            project["slug"],
+            project["title"],
+            project["description"],
+            project["project_type"],
+            project["downloads"],
+            project.get("icon_url"),
+            json.dumps(versions),
+            json.dumps(categories),
+            time.time(),
+        ))
+    if not rows:
+        return
+    with closing(connect()) as connection, connection:
+        connection.executemany(
+            """
+            INSERT INTO projects VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(project_id) DO UPDATE SET
+                slug = excluded.slug,
+                title = excluded.title,
+                description = excluded.description,
+                project_type = excluded.project_type,
+                downloads = excluded.downloads,
+                icon_url = excluded.icon_url,
+                versions = excluded.versions,
+                categories = excluded.categories,
+                updated_at = excluded.updated_at
+            """,
+            rows,
+        )
+
+
+def row_to_project(row: sqlite3.Row) -> dict[str, Any]:
+    return {
+        "project_id": row["project_id"],
+        "id": row["project_id"],
+        "slug": row["slug"],
+        "title": row["title"],
+        "description": row["description"],
+        "project_type": row["project_type"],
+        "downloads": row["downloads"],
+        "icon_url": row["icon_url"],
+        "versions": json.loads(row["versions"]),
+        "categories": json.loads(row["categories"]),
+    }
+
+
+def search(
+    query: str,
+    game_version: str,
+    loader: str | None,
+    project_type: str | None,
+    offset: int,
+    limit: int,
+) -> tuple[list[dict[str, Any]], int]:
+    tables = "projects"
+    conditions = []
+    params: list[Any] = []
+    tokens = re.findall(r"\w+", query)
+    if tokens:
+        tables = "projects JOIN projects_fts ON projects_fts.rowid = projects.rowid"
+        conditions.append("projects_fts MATCH ?")
+        params.append(" ".join(f'"{token}"*' for token in tokens))
+    if game_version:
+        conditions.append(
+            "EXISTS (SELECT 1 FROM json_each(projects.versions) WHERE value = ?)"
+        )
+        params.append(game_version)
+    if loader is not None:
+        conditions.append(
+            "EXISTS (SELECT 1 FROM json_each(projects.categories) WHERE value = ?)"
+        )
+        params.append(loader)
+    if project_type is not None:
+        conditions.append("projects.project_type = ?")
+        params.append(project_type)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = "projects_fts.rank" if tokens else "projects.downloads DESC"
+    with closing(connect()) as connection:
+        total_hits = connection.execute(
+            f"SELECT COUNT(*) FROM {tables} {where}", params
+        ).fetchone()[0]
+        rows = connection.execute(
+            f"SELECT projects.* FROM {tables} {where} ORDER BY {order} LIMIT ? OFFSET ?",
+            [*params, limit, offset],
+        ).fetchall()
+    return [row_to_project(row) for row in rows], total_hits
+
+
+def get_projects(project_ids: list[str]) -> list[dict[str, Any]]:
+    with closing(connect()) as connection:
+        rows = connection.execute(
+            f"SELECT * FROM projects WHERE project_id IN ({', '.join('?' * len(project_ids))})",
+            project_ids,
+        ).fetchall()
+    return [row_to_project(row) for row in rows]
+
+
+def add_version_files(versions: dict[str, dict[str, Any]]):
+    if not versions:
+        return
+    with closing(connect()) as connection, connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO version_files VALUES (?, ?)",
+            [
+                (
+                    sha512,
+                    json.dumps({
+                        key: value
+                        for key, value in project_version.items()
+                        if key != "changelog"
+                    }),
+                )
+                for sha512, project_version in versions.items()
+            ],
+        )
+
+
+def get_version_files(hashes: list[str]) -> dict[str, dict[str, Any]]:
+    with closing(connect()) as connection:
+        rows = connection.execute(
+            f"SELECT * FROM version_files WHERE sha512 IN ({', '.join('?' * len(hashes))})",
+            hashes,
+        ).fetchall()
+    return {row["sha512"]: json.loads(row["version"]) for row in rows}
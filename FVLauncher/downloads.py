@@ -0,0 +1,356 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing.queues import Queue
+from multiprocessing.synchronize import Event
+from typing import Any
+
+import fileutils
+import modrinth
+import requests
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 10
+CHUNK_SIZE = 64 * 1024
+MAX_WORKERS = 16
+PROGRESS_UPDATE_INTERVAL = 0.1
+MAX_RESUME_ATTEMPTS = 5
+HASH_ALGORITHMS = ("sha512", "sha1")
+PRIORITY_LAUNCH = 0
+PRIORITY_USER = 1
+PRIORITY_BACKGROUND = 2
+# A priority class counts as active while its transfers report progress.
+# Installs done by minecraft_launcher_lib only send heartbeats, the speed cap
+# and pause apply to transfers made through this module
+PRIORITY_HEARTBEAT_TIMEOUT = 5
+WAIT_INTERVAL = 0.1
+QUEUE_PATH = os.path.join("cache", "download_queue.json")
+
+session = requests.Session()
+session.headers["User-Agent"] = modrinth.USER_AGENT
+session.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=MAX_WORKERS,
+        max_retries=Retry(
+            total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]
+        ),
+    ),
+)
+
+
+# Shared by every process that downloads, see create_shared_state
+shared_state: dict[str, Any] | None = None
+queue_lock = threading.Lock()
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+class HashMismatchError(Exception):
+    pass
+
+
+def create_shared_state(bandwidth_limit: int) -> dict[str, Any]:
+    return {
+        "lock": multiprocessing.Lock(),
+        "paused": multiprocessing.Event(),
+        "bandwidth_limit": multiprocessing.RawValue("i", bandwidth_limit),
+        "tokens": multiprocessing.RawValue("d", 0),
+        "tokens_updated_at": multiprocessing.RawValue("d", 0),
+        "heartbeats": multiprocessing.RawArray("d", PRIORITY_BACKGROUND + 1),
+    }
+
+
+def set_bandwidth_limit(bandwidth_limit: int):
+    if shared_state is not None:
+        shared_state["bandwidth_limit"].value = bandwidth_limit
+
+
+def is_paused() -> bool:
+    return shared_state is not None and shared_state["paused"].is_set()
+
+
+def set_paused(paused: bool):
+    if shared_state is None:
+        return
+    if paused:
+        shared_state["paused"].set()
+    else:
+        shared_state["paused"].clear()
+
+
+def heartbeat(priority: int):
+    if shared_state is not None:
+        shared_state["heartbeats"][priority] = time.monotonic()
+
+
+def wait_for_turn(priority: int, cancel_event: Event | threading.Event):
+    if shared_state is None:
+        return
+    while not cancel_event.is_set():
+        now = time.monotonic()
+        if not (
+            any(
+                now - shared_state["heartbeats"][higher_priority]
+                < PRIORITY_HEARTBEAT_TIMEOUT
+                for higher_priority in range(priority)
+            )
+            or (priority != PRIORITY_LAUNCH and shared_state["paused"].is_set())
+        ):
+            return
+        time.sleep(WAIT_INTERVAL)
+
+
+def consume_bandwidth(size: int):
+    if shared_state is None:
+        return
+    # Token bucket that may go into debt; whoever takes the last tokens
+    # sleeps until the bucket would have refilled
+    with shared_state["lock"]:
+        bandwidth_limit = shared_state["bandwidth_limit"].value
+        if bandwidth_limit <= 0:
+            return
+        now = time.monotonic()
+        tokens = min(
+            max(bandwidth_limit, CHUNK_SIZE),
+            shared_state["tokens"].value
+            + (now - shared_state["tokens_updated_at"].value) * bandwidth_limit,
+        )
+        tokens -= size
+        shared_state["tokens"].value = tokens
+        shared_state["tokens_updated_at"].value = now
+    if tokens < 0:
+        time.sleep(-tokens / bandwidth_limit)
+
+
+def load_queue() -> dict[str, dict[str, Any]]:
+    try:
+        with open(QUEUE_PATH, encoding="utf-8") as queue_file:
+            return json.load(queue_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def update_queue(update: Callable[[dict[str, dict[str, Any]]], None]):
+    lock = shared_state["lock"] if shared_state is not None else queue_lock
+    with lock:
+        jobs = load_queue()
+        update(jobs)
+        fileutils.write_json_atomically(QUEUE_PATH, jobs)
+
+
+def add_job(job: dict[str, Any]) -> str:
+    job_id = uuid.uuid4().hex
+    update_queue(lambda jobs: jobs.update({job_id: job}))
+    return job_id
+
+
+def remove_job(job_id: str):
+    update_queue(lambda jobs: jobs.pop(job_id, None))
+
+
+def get_expected_hash(file: dict[str, Any]) -> tuple[str | None, str | None]:
+    hashes = file.get("hashes") or {}
+    for algorithm in HASH_ALGORITHMS:
+        if hashes.get(algorithm):
+            return algorithm, hashes[algorithm]
+    return None, None
+
+
+def hash_part(part_path: str, algorithm: str) -> Any:
+    file_hash = hashlib.new(algorithm)
+    with open(part_path, "rb") as fp:
+        while chunk := fp.read(CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash
+
+
+def remove_part(part_path: str):
+    for path in (part_path, f"{part_path}.url"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def download(
+    url: str,
+    path: str,
+    queue: Queue | None,
+    priority: int = PRIORITY_USER,
+    size: int | None = None,
+    hashes: dict[str, str] | None = None,
+):
+    download_files(
+        [{"url": url, "path": path, "size": size, "hashes": hashes}],
+        1,
+        queue,
+        threading.Event(),
+        priority=priority,
+    )
+
+
+def download_files(
+    files: list[dict[str, Any]],
+    max_workers: int,
+    queue: Queue | None,
+    cancel_event: Event | threading.Event,
+    on_file_downloaded: Callable[[dict[str, Any]], None] | None = None,
+    priority: int = PRIORITY_USER,
+):
+    total_size = sum(file.get("size") or 0 for file in files)
+    downloaded_size = 0
+    last_progress_update = 0.0
+    progress_lock = threading.Lock()
+
+    # Every transfer adds to one byte counter, and the window gets at most one
+    # update per PROGRESS_UPDATE_INTERVAL
+    def add_progress(size: int):
+        nonlocal downloaded_size, last_progress_update
+        if queue is None:
+            return
+        with progress_lock:
+            downloaded_size += size
+            now = time.monotonic()
+            if (
+                now - last_progress_update < PROGRESS_UPDATE_INTERVAL
+                and downloaded_size < total_size
+            ):
+                return
+            last_progress_update = now
+            current_size = downloaded_size
+        queue.put(("progressbar", min(100, current_size / max(total_size, 1) * 100)))
+        queue.put((
+            "status",
+            f"Загрузка файлов: {current_size / 1024 / 1024:.1f} из {total_size / 1024 / 1024:.1f} МБ",
+        ))
+
+    def add_total_size(size: int):
+        nonlocal total_size
+        with progress_lock:
+            total_size += size
+
+    def download_file(file: dict[str, Any]):
+        # Data goes to a .part file next to the target, which is kept after an
+        # interruption so the next attempt continues it with a Range request
+        part_path = f"{file['path']}.part"
+        # The URL the .part file was downloaded from is kept next to it, a part
+        # of another URL is started over instead of being continued
+        part_url_path = f"{part_path}.url"
+        try:
+            with open(part_url_path, encoding="utf-8") as part_url_file:
+                part_url = part_url_file.read()
+        except FileNotFoundError:
+            part_url = None
+        if part_url != file["url"]:
+            remove_part(part_path)
+            fileutils.write_file_atomically(part_url_path, file["url"])
+        algorithm, expected_hash = get_expected_hash(file)
+        counted_size = 0
+        size_known = bool(file.get("size"))
+        for attempt in range(MAX_RESUME_ATTEMPTS + 1):
+            try:
+                part_size = os.path.getsize(part_path)
+            except FileNotFoundError:
+                part_size = 0
+            add_progress(part_size - counted_size)
+            counted_size = part_size
+            file_hash = None
+            if algorithm is not None:
+                if part_size:
+                    file_hash = hash_part(part_path, algorithm)
+                else:
+                    file_hash = hashlib.new(algorithm)
+            headers = {"Range": f"bytes={part_size}-"} if part_size else {}
+            try:
+                with session.get(
+                    file["url"], headers=headers, stream=True, timeout=TIMEOUT
+                ) as r:
+                    # The .part file already holds the whole file, unless the
+                    # server reports another size
+                    if r.status_code == 416:
+                        content_range = r.headers.get("Content-Range")
+                        if content_range in (None, f"bytes */{part_size}"):
+                            break
+                        logger.debug(
+                            f"{file['url']} is {content_range}, the .part file is {part_size} bytes"
+                        )
+                        os.remove(part_path)
+                        continue
+                    r.raise_for_status()
+                    if r.status_code != 206 and part_size:
+                        logger.debug(f"{file['url']} does not support resuming")
+                        add_progress(-counted_size)
+                        counted_size = 0
+                        if algorithm is not None:
+                            file_hash = hashlib.new(algorithm)
+                    if not size_known and "Content-Length" in r.headers:
+                        add_total_size(
+                            int(r.headers["Content-Length"])
+                            + (part_size if r.status_code == 206 else 0)
+                        )
+                        size_known = True
+                    with open(part_path, "ab" if r.status_code == 206 else "wb") as fp:
+                        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                            wait_for_turn(priority, cancel_event)
+                            if cancel_event.is_set():
+                                raise DownloadCancelled
+                            consume_bandwidth(len(chunk))
+                            heartbeat(priority)
+                            fp.write(chunk)
+                            if file_hash is not None:
+                                file_hash.update(chunk)
+                            add_progress(len(chunk))
+                            counted_size += len(chunk)
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ) as e:
+                if attempt == MAX_RESUME_ATTEMPTS:
+                    raise
+                logger.debug(f"Download of {file['url']} interrupted ({e}), resuming")
+                continue
+            break
+
+        if file_hash is not None and file_hash.hexdigest() != expected_hash:
+            remove_part(part_path)
+            add_progress(-counted_size)
+            raise HashMismatchError(
+                f"{algorithm} of {file['url']} is {file_hash.hexdigest()}, expected {expected_hash}"
+            )
+        os.replace(part_path, file["path"])
+        os.remove(part_url_path)
+        logger.debug(f"Downloaded {file['url']} to {file['path']}")
+        if on_file_downloaded is not None:
+            on_file_downloaded(file)
+
+    errors = []
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, MAX_WORKERS))
+    ) as executor:
+        futures = {executor.submit(download_file, file): file for file in files}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except DownloadCancelled:
+                pass
+            except Exception as e:  # noqa: BLE001
+                logger.debug(f"Failed to download {futures[future]['url']}: {e}")
+                errors.append(e)
+    if cancel_event.is_set():
+        logger.debug("Downloads cancelled")
+    elif errors:
+        raise errors[0]
@@ -0,0 +1,33 @@
+import json
+import os
+import shutil
+import threading
+from typing import Any
+
+
+def get_tmp_path(path: str) -> str:
+    # Unique per process and thread, so concurrent writers never share one
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def write_file_atomically(path: str, content: str | bytes):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = get_tmp_path(path)
+    if isinstance(content, bytes):
+        with open(tmp_path, "wb") as fp:
+            fp.write(content)
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            fp.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_json_atomically(path: str, data: Any):
+    write_file_atomically(path, json.dumps(data))
+
+
+def copy_file_atomically(src: str, dst: str):
+    tmp_path = get_tmp_path(dst)
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
@@ -1,18 +1,27 @@
+import bisect
 import configparser
 import json
 import logging
 import multiprocessing
 import os
+import queue
 import shutil
 import sys
+import threading
 import time
 import traceback
 import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
+import downloads
 import minecraft_launcher_lib
+import modrinth
 import pypresence.exceptions
 import requests
+import runtimes
+import thumbnails
 import updater
 import utils
 from faker import Faker
@@ -69,6 +78,10 @@ def load_config():
             "show_other_versions": "1",
             "show_instances_and_packs": "1",
             "minecraft_directory": "",
+            "thumbnails_cache_size": "64",
+            "local_catalog": "1",
+            "download_workers": "4",
+            "download_speed_limit": "0",
         },
         "Experiments": {
             "allow_experiments": "0",
@@ -171,10 +184,35 @@ def update_ui_from_queue(self):
                         utils.start_rich_presence(self.rpc, *other_info)
                     case "minecraft_closed":
                         utils.start_rich_presence(self.rpc)
-            case "projects":
-                self.projects = value
-                self.other_projects_paths = other_info[0]
-                self._make_ui()
+            case "project":
+                self.add_project(value, *other_info)
+            case "projects_loaded":
+                self.on_projects_loaded(value)
+            case "search_results":
+                self.show_search_results(value, *other_info)
+            case "loaders_and_files":
+                self.show_loaders(value)
+            case "project_icon":
+                self.set_project_icon(value, *other_info)
+            case "prefetched_project":
+                self.store_prefetched_project(value, *other_info)
+
+
+class DownloadControls:
+    def toggle_pause(self):
+        downloads.set_paused(not downloads.is_paused())
+        self.pause_button.setText("Продолжить" if downloads.is_paused() else "Пауза")
+
+    def cancel_download(self):
+        if not hasattr(self, "download_process"):
+            return
+        # Workers stop between chunks and keep .part files for resuming
+        self.cancel_download_event.set()
+        self.download_process.join(utils.Constants.DOWNLOAD_CANCEL_TIMEOUT)
+        if self.download_process.is_alive():
+            self.download_process.terminate()
+        # A paused job stays queued for the next start, new downloads run
+        downloads.set_paused(False)
 
 
 class ClickableLabel(QtWidgets.QLabel):
@@ -188,16 +226,21 @@ class ClickableLabel(QtWidgets.QLabel):
         self.setToolTip("Кликните для просмотра")
 
     clicked = Signal()
+    hovered = Signal()
 
     def mouseReleaseEvent(self, e: QtGui.QMouseEvent):
         self.clicked.emit()
         super().mouseReleaseEvent(e)
 
+    def enterEvent(self, e: QtGui.QEnterEvent):
+        self.hovered.emit()
+        super().enterEvent(e)
+
 
 class ProjectsSearch(QtWidgets.QDialog):
     class ProjectInfoWindow(QtWidgets.QDialog):
-        class ProjectLoadersChooseWindow(QtWidgets.QDialog):
-            class ProjectInstallWindow(QtWidgets.QDialog):
+        class ProjectLoadersChooseWindow(DownloadControls, QtWidgets.QDialog):
+            class ProjectInstallWindow(DownloadControls, QtWidgets.QDialog):
                 def __init__(
                     self,
                     parent: QtWidgets.QWidget,
@@ -220,11 +263,7 @@ class ProjectsSearch(QtWidgets.QDialog):
                     return super().reject()
 
                 def closeEvent(self, event: QtGui.QCloseEvent):
-                    try:
-                        for p in self.processes:
-                            p.terminate()
-                    except AttributeError:
-                        pass
+                    self.cancel_download()
                     return super().closeEvent(event)
 
                 def download_projects_process(
@@ -234,12 +273,7 @@ class ProjectsSearch(QtWidgets.QDialog):
                     mc_version: str,
                     loader: str,
                 ):
-                    self.processes = []
-                    self.queue = multiprocessing.Queue()
-                    self.timer = QTimer()
-                    self.timer.timeout.connect(lambda: update_ui_from_queue(self))
-                    self.timer.start(200)
-
+                    files_to_download = []
                     for project_file in project_files:
                         if not (project_file["primary_project"]):
                             dependencies_types = {
@@ -351,20 +385,44 @@ class ProjectsSearch(QtWidgets.QDialog):
                             os.makedirs(
                                 os.path.dirname(project_file_path), exist_ok=True
                             )
+                        files_to_download.append({
+                            **project_file,
+                            "path": project_file_path,
+                        })
 
-                        self.processes.append(
-                            multiprocessing.Process(
-                                target=utils.run_in_process_with_exceptions_logging,
-                                args=(
-                                    utils.only_project_install,
-                                    project_file,
-                                    project_file_path,
-                                ),
-                                kwargs={"queue": self.queue},
-                                daemon=True,
-                            )
-                        )
-                        self.processes[-1].start()
+                    if not files_to_download:
+                        return
+                    self.queue = multiprocessing.Queue()
+                    self.timer = QTimer()
+                    self.timer.timeout.connect(lambda: update_ui_from_queue(self))
+                    self.timer.start(200)
+                    # One process downloads every file through a shared pool
+                    self.cancel_download_event = multiprocessing.Event()
+                    self.download_process = multiprocessing.Process(
+                        target=utils.run_in_process_with_exceptions_logging,
+                        args=(
+                            utils.install_projects,
+                            files_to_download,
+                            self.minecraft_directory,
+                            main_window.download_workers,
+                            self.cancel_download_event,
+                        ),
+                        kwargs={
+                            "queue": self.queue,
+                            "download_state": main_window.download_state,
+                        },
+                        daemon=True,
+                    )
+                    self.download_process.start()
+                    if not hasattr(self, "pause_button"):
+                        self.pause_button = QtWidgets.QPushButton(self)
+                        self.pause_button.move(100, 470)
+                        self.pause_button.setFixedWidth(100)
+                        self.pause_button.clicked.connect(self.toggle_pause)
+                        self.pause_button.show()
+                    self.pause_button.setText(
+                        "Продолжить" if downloads.is_paused() else "Пауза"
+                    )
 
                 def _make_ui(self):
                     instances = []
@@ -449,145 +507,15 @@ class ProjectsSearch(QtWidgets.QDialog):
             def closeEvent(self, event: QtGui.QCloseEvent):
                 if hasattr(self, "import_mrpack_process"):
                     self.import_mrpack_process.terminate()
+                self.resolve_project_files_process.terminate()
+                self.cancel_download()
                 return super().closeEvent(event)
 
-            def find_file(
-                self,
-                project_versions_info,
-                title,
-                project_type,
-                project_id,
-                dependency_type=None,
-                is_dependencies=False,
-            ):
-                if is_dependencies and project_id in self.processed_projects:
-                    return
-
-                self.processed_projects.add(project_id)
-
-                for project_version in project_versions_info:
-                    for loader in project_version["loaders"]:
-                        if (loader not in self.loaders_and_files) or not any(
-                            f["project_id"] == project_id
-                            for f in self.loaders_and_files[loader]
-                        ):
-                            self.loaders_and_files.setdefault(loader, [])
-                            for file in project_version["files"]:
-                                file["title"] = title
-                                file["project_id"] = project_id
-                                file["project_type"] = project_type
-                                if not is_dependencies:
-                                    file["primary_project"] = True
-                                else:
-                                    file["primary_project"] = False
-                                if file["primary"]:
-                                    self.loaders_and_files[loader].append(file)
-                                    break
-                            else:
-                                project_version["files"][0]["title"] = title
-                                project_version["files"][0]["project_id"] = project_id
-                                project_version["files"][0]["project_type"] = (
-                                    project_type
-                                )
-                                self.loaders_and_files[loader].append(
-                                    project_version["files"][0]
-                                )
-                            file["dependency_type"] = dependency_type
-
-                            for file in project_version["dependencies"]:
-                                dependency_type = file.get("dependency_type")
-                                if dependency_type in [
-                                    "incompatible",
-                                    "embedded",
-                                ]:
-                                    continue
-                                if file.get("version_id") is not None:
-                                    with requests.get(
-                                        f"https://api.modrinth.com/v2/version/{file['version_id']}",
-                                        timeout=10,
-                                    ) as r:
-                                        dependency_project_id = r.json()["project_id"]
-                                        with requests.get(
-                                            f"https://api.modrinth.com/v2/project/{dependency_project_id}",
-                                            timeout=10,
-                                        ) as r1:
-                                            self.find_file(
-                                                [r.json()],
-                                                r1.json()["title"],
-                                                r1.json()["project_type"],
-                                                dependency_project_id,
-                                                file["dependency_type"],
-                                                is_dependencies=True,
-                                            )
-                                elif file.get("project_id") is not None:
-                                    with (
-                                        requests.get(
-                                            f"https://api.modrinth.com/v2/project/{file['project_id']}/version",
-                                            params={
-                                                "game_versions": json.dumps([
-                                                    self.mc_version
-                                                ]),
-                                                "loaders": json.dumps([loader]),
-                                            },
-                                            timeout=10,
-                                        ) as r,
-                                        requests.get(
-                                            f"https://api.modrinth.com/v2/project/{file['project_id']}",
-                                            timeout=10,
-                                        ) as r1,
-                                    ):
-                                        try:
-                                            self.find_file(
-                                                [r.json()[0]],
-                                                r1.json()["title"],
-                                                r1.json()["project_type"],
-                                                file["project_id"],
-                                                file["dependency_type"],
-                                                is_dependencies=True,
-                                            )
-                                        except IndexError:
-                                            pass
-
-            def _make_ui(self):
-                self.setModal(True)
-                self.setWindowTitle(f"Загрузка {self.project['title']}")
-                self.setFixedSize(300, 500)
-
-                with requests.get(
-                    f"https://api.modrinth.com/v2/project/{self.project['project_id']}/version",
-                    params={"game_versions": json.dumps([self.mc_version])},
-                    timeout=10,
-                ) as r:
-                    r.raise_for_status()
-                    project_versions_info = r.json()
-
-                self.loaders_and_files = {}
-                self.processed_projects = set()
-                self.find_file(
-                    project_versions_info,
-                    self.project["title"],
-                    self.project["project_type"],
-                    self.project["project_id"],
-                )
-
-                self.loaders_container = QtWidgets.QWidget()
-                self.loaders_layout = QtWidgets.QVBoxLayout(self.loaders_container)
-
-                self.scroll_area = QtWidgets.QScrollArea(self)
-                self.scroll_area.setFixedSize(300, 200)
-                self.scroll_area.setWidget(self.loaders_container)
-                self.scroll_area.setWidgetResizable(True)
-
-                if self.project["project_type"] == "modpack":
-                    self.progressbar = QtWidgets.QProgressBar(self, textVisible=False)
-                    self.progressbar.setFixedWidth(260)
-                    self.progressbar.move(20, 430)
-
-                    self.download_info_label = QtWidgets.QLabel(self)
-                    self.download_info_label.setFixedWidth(290)
-                    self.download_info_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.download_info_label.move(5, 450)
-
+            def show_loaders(self, loaders_and_files: dict[str, list[dict]]):
+                self.timer.stop()
+                self.loaders_and_files = loaders_and_files
+                self.progressbar.setValue(0)
+                self.download_info_label.setText("")
                 for loader in self.loaders_and_files:
                     download_button = ClickableLabel(self)
                     download_button.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -620,14 +548,58 @@ class ProjectsSearch(QtWidgets.QDialog):
                         )
                     self.loaders_layout.addWidget(download_button)
 
+            def _make_ui(self):
+                self.setModal(True)
+                self.setWindowTitle(f"Загрузка {self.project['title']}")
+                self.setFixedSize(300, 500)
+
+                self.loaders_container = QtWidgets.QWidget()
+                self.loaders_layout = QtWidgets.QVBoxLayout(self.loaders_container)
+
+                self.scroll_area = QtWidgets.QScrollArea(self)
+                self.scroll_area.setFixedSize(300, 200)
+                self.scroll_area.setWidget(self.loaders_container)
+                self.scroll_area.setWidgetResizable(True)
+
+                self.progressbar = QtWidgets.QProgressBar(self, textVisible=False)
+                self.progressbar.setFixedWidth(260)
+                self.progressbar.move(20, 430)
+
+                self.download_info_label = QtWidgets.QLabel(self)
+                self.download_info_label.setFixedWidth(290)
+                self.download_info_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.download_info_label.move(5, 450)
+
+                self.queue = multiprocessing.Queue()
+                self.resolve_project_files_process = multiprocessing.Process(
+                    target=utils.run_in_process_with_exceptions_logging,
+                    args=(
+                        utils.resolve_project_files,
+                        self.project,
+                        self.mc_version,
+                        main_window.no_internet_connection,
+                    ),
+                    kwargs={"queue": self.queue},
+                    daemon=True,
+                )
+                self.resolve_project_files_process.start()
+                self.timer = QTimer()
+                self.timer.timeout.connect(lambda: update_ui_from_queue(self))
+                self.timer.start(200)
+
                 self.show()
 
         def __init__(
-            self, parent: QtWidgets.QWidget, project: dict, minecraft_directory: str
+            self,
+            parent: QtWidgets.QWidget,
+            project: dict,
+            minecraft_directory: str,
+            prefetched: dict | None = None,
         ):
             super().__init__(parent)
             self.minecraft_directory = minecraft_directory
             self.project = project
+            self.prefetched = prefetched or {}
             self._make_ui()
 
         def _make_ui(self):
@@ -647,11 +619,23 @@ class ProjectsSearch(QtWidgets.QDialog):
             self.icon = QtGui.QPixmap()
             self.icon_url = self.project["icon_url"]
             if self.icon_url:
-                with requests.get(self.icon_url, timeout=10) as r:
-                    r.raise_for_status()
-                    self.icon.loadFromData(r.content)
+                icon_bytes = self.prefetched.get("icon")
+                if icon_bytes is None:
+                    try:
+                        icon_bytes = thumbnails.get_thumbnail(
+                            self.icon_url,
+                            100,
+                            main_window.thumbnails_cache_size * 1024 * 1024,
+                            offline=main_window.no_internet_connection,
+                        )
+                    except requests.RequestException as e:
+                        logger.debug(
+                            f"Failed to load icon of {self.project['project_id']} project: {e}"
+                        )
+                    thumbnails.save_index()
+                if icon_bytes is not None:
+                    self.icon.loadFromData(icon_bytes)
                 self.project_icon = QtWidgets.QLabel(self)
-                self.icon = self.icon.scaled(100, 100)
                 self.project_icon.setPixmap(self.icon)
                 self.project_icon.move(100, 40)
 
@@ -696,6 +680,9 @@ class ProjectsSearch(QtWidgets.QDialog):
         return super().reject()
 
     def closeEvent(self, event: QtGui.QCloseEvent):
+        self.timer.stop()
+        self.search_executor.shutdown(wait=False, cancel_futures=True)
+        self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
         for filename in os.listdir(self.minecraft_directory):
             if filename.endswith(".mrpack"):
                 os.remove(os.path.join(self.minecraft_directory, filename))
@@ -704,56 +691,281 @@ class ProjectsSearch(QtWidgets.QDialog):
     def __init__(self, parent: QtWidgets.QWidget, minecraft_directory: str):
         super().__init__(parent)
         self.minecraft_directory = minecraft_directory
+        self.search_generation = 0
+        self.search_future = None
+        self.loaded_hits_len = 0
+        self.total_hits = 0
+        self.page_loading = False
+        self.showing_local_results = False
+        self.search_executor = ThreadPoolExecutor(max_workers=2)
+        self.prefetch_executor = ThreadPoolExecutor(
+            max_workers=utils.Constants.PREFETCH_WORKERS
+        )
+        self.prefetched = OrderedDict()
+        self.prefetching = set()
+        self.queue = queue.Queue()
+        self.timer = QTimer()
+        self.timer.timeout.connect(lambda: update_ui_from_queue(self))
+        self.timer.start(50)
         self._make_ui()
 
-    def search(self, query: str):
+    def submit_search(self, offset: int):
+        self.page_loading = True
+        self.search_future = self.search_executor.submit(
+            utils.run_in_process_with_exceptions_logging,
+            utils.search_modrinth_projects,
+            self.search_string.text(),
+            self.game_version_entry.text(),
+            self.loaders_combobox.currentData(),
+            self.project_types_combobox.currentData(),
+            offset,
+            self.search_generation,
+            bool(main_window.local_catalog),
+            queue=self.queue,
+        )
+
+    def search(self):
+        self.search_debounce_timer.stop()
+        # Results of older queries are dropped in show_search_results
+        self.search_generation += 1
+        if self.search_future is not None:
+            self.search_future.cancel()
+        self.clear_search_results()
+        self.total_hits = 0
+        self.showing_local_results = False
+        self.submit_search(0)
+
+    def clear_search_results(self):
         while self.p_layout.count():
             widget = self.p_layout.takeAt(0).widget()
             if widget is not None:
                 widget.deleteLater()
-        with requests.get(
-            "https://api.modrinth.com/v2/search", params={"query": query}, timeout=10
-        ) as r:
-            r.raise_for_status()
-            info = json.loads(r.text)
-        for project in info["hits"]:
+        self.loaded_hits_len = 0
+
+    def prefetch(self, project: dict):
+        if (
+            main_window.no_internet_connection
+            or not project["icon_url"]
+            or project["project_id"] in self.prefetched
+            or project["project_id"] in self.prefetching
+        ):
+            return
+        self.prefetching.add(project["project_id"])
+        self.prefetch_executor.submit(
+            utils.prefetch_project,
+            project,
+            main_window.thumbnails_cache_size * 1024 * 1024,
+            self.queue,
+        )
+
+    def store_prefetched_project(self, project_id: str, prefetched: dict | None):
+        self.prefetching.discard(project_id)
+        if prefetched is None:
+            return
+        self.prefetched[project_id] = prefetched
+        while len(self.prefetched) > utils.Constants.PREFETCH_CACHE_SIZE:
+            self.prefetched.popitem(last=False)
+
+    def get_prefetched(self, project_id: str) -> dict | None:
+        if project_id not in self.prefetched:
+            return None
+        self.prefetched.move_to_end(project_id)
+        return self.prefetched[project_id]
+
+    def load_next_page(self, scroll_value: int):
+        if (
+            not self.page_loading
+            and self.loaded_hits_len < self.total_hits
+            and scroll_value
+            >= self.scroll_area.verticalScrollBar().maximum()
+            - utils.Constants.SEARCH_PAGE_PRELOAD_DISTANCE
+        ):
+            self.submit_search(self.loaded_hits_len)
+
+    def show_search_results(
+        self,
+        generation: int,
+        offset: int,
+        hits: list[dict],
+        total_hits: int | None,
+        final: bool,
+    ):
+        if generation != self.search_generation:
+            return
+        # Results from the local catalog are replaced by the network ones
+        if self.showing_local_results and final:
+            self.showing_local_results = False
+            self.clear_search_results()
+        if offset != self.loaded_hits_len:
+            return
+        if final:
+            self.page_loading = False
+        else:
+            self.showing_local_results = True
+        self.loaded_hits_len += len(hits)
+        # None comes with a failed search, the page can be requested again
+        if total_hits is not None:
+            self.total_hits = total_hits
+        for project in hits:
             w = ClickableLabel(text=project["title"])
             w.clicked.connect(
                 lambda current_project=project: self.ProjectInfoWindow(
-                    self, current_project, self.minecraft_directory
+                    self,
+                    current_project,
+                    self.minecraft_directory,
+                    self.get_prefetched(current_project["project_id"]),
                 )
             )
+            w.hovered.connect(
+                lambda current_project=project: self.prefetch(current_project)
+            )
             self.p_layout.addWidget(w)
+        if offset == 0:
+            for project in hits[: utils.Constants.PREFETCH_TOP_HITS]:
+                self.prefetch(project)
 
     def _make_ui(self):
         self.setWindowTitle("Поиск проектов на Modrinth")
         self.setFixedSize(300, 500)
         self.setModal(True)
 
+        self.search_debounce_timer = QTimer(self)
+        self.search_debounce_timer.setSingleShot(True)
+        self.search_debounce_timer.setInterval(utils.Constants.SEARCH_DEBOUNCE_MS)
+        self.search_debounce_timer.timeout.connect(self.search)
+
         self.search_string = QtWidgets.QLineEdit(self)
         self.search_string.move(20, 20)
         self.search_string.setFixedWidth(200)
+        self.search_string.textChanged.connect(self.search_debounce_timer.start)
 
         self.search_button = QtWidgets.QPushButton(self)
         self.search_button.move(240, 20)
         self.search_button.setFixedWidth(40)
         self.search_button.setText("Поиск")
-        self.search_button.clicked.connect(
-            lambda: self.search(self.search_string.text())
-        )
+        self.search_button.clicked.connect(self.search)
+
+        self.game_version_entry = QtWidgets.QLineEdit(self)
+        self.game_version_entry.move(20, 55)
+        self.game_version_entry.setFixedWidth(70)
+        self.game_version_entry.setPlaceholderText("Версия")
+        self.game_version_entry.textChanged.connect(self.search_debounce_timer.start)
+
+        self.loaders_combobox = QtWidgets.QComboBox(self)
+        self.loaders_combobox.move(100, 55)
+        self.loaders_combobox.setFixedWidth(80)
+        self.loaders_combobox.addItem("Загрузчик", None)
+        for loader in ["fabric", "forge", "quilt", "neoforge"]:
+            self.loaders_combobox.addItem(loader, loader)
+        self.loaders_combobox.currentIndexChanged.connect(self.search)
+
+        self.project_types_combobox = QtWidgets.QComboBox(self)
+        self.project_types_combobox.move(190, 55)
+        self.project_types_combobox.setFixedWidth(90)
+        self.project_types_combobox.addItem("Тип", None)
+        for project_type, project_type_name in type_to_russian_name.items():
+            self.project_types_combobox.addItem(
+                project_type_name.capitalize(), project_type
+            )
+        self.project_types_combobox.currentIndexChanged.connect(self.search)
 
         self.container = QtWidgets.QWidget()
         self.p_layout = QtWidgets.QVBoxLayout(self.container)
+        self.p_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
 
         self.scroll_area = QtWidgets.QScrollArea(self)
-        self.scroll_area.move(0, 60)
-        self.scroll_area.setFixedSize(300, 400)
+        self.scroll_area.move(0, 90)
+        self.scroll_area.setFixedSize(300, 370)
         self.scroll_area.setWidget(self.container)
         self.scroll_area.setWidgetResizable(True)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.load_next_page)
+        self.scroll_area.verticalScrollBar().rangeChanged.connect(
+            lambda *args: self.load_next_page(
+                self.scroll_area.verticalScrollBar().value()
+            )
+        )
 
         self.show()
 
 
+class DownloadQueueWindow(DownloadControls, QtWidgets.QDialog):
+    window_title = "Незавершённые загрузки"
+
+    def __init__(self, parent: QtWidgets.QWidget):
+        super().__init__(parent)
+        # Also opened from MainWindow.__init__, before main_window is assigned
+        self.main_window = parent
+        self._make_ui()
+
+    def get_download_process_args(self) -> tuple[Any, ...]:
+        return (
+            utils.resume_downloads,
+            self.main_window.download_workers,
+            self.cancel_download_event,
+        )
+
+    def reject(self):
+        self.close()
+        return super().reject()
+
+    def closeEvent(self, event: QtGui.QCloseEvent):
+        self.timer.stop()
+        self.cancel_download()
+        return super().closeEvent(event)
+
+    def _make_ui(self):
+        self.setWindowTitle(self.window_title)
+        self.setFixedSize(300, 120)
+        self.setModal(True)
+
+        self.progressbar = QtWidgets.QProgressBar(self, textVisible=False)
+        self.progressbar.setFixedWidth(260)
+        self.progressbar.move(20, 20)
+
+        self.download_info_label = QtWidgets.QLabel(self)
+        self.download_info_label.setFixedWidth(290)
+        self.download_info_label.move(5, 45)
+        self.download_info_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        self.pause_button = QtWidgets.QPushButton(self)
+        self.pause_button.move(100, 75)
+        self.pause_button.setFixedWidth(100)
+        self.pause_button.setText("Пауза")
+        self.pause_button.clicked.connect(self.toggle_pause)
+
+        self.queue = multiprocessing.Queue()
+        self.cancel_download_event = multiprocessing.Event()
+        self.download_process = multiprocessing.Process(
+            target=utils.run_in_process_with_exceptions_logging,
+            args=self.get_download_process_args(),
+            kwargs={
+                "queue": self.queue,
+                "download_state": self.main_window.download_state,
+            },
+            daemon=True,
+        )
+        self.download_process.start()
+        self.timer = QTimer()
+        self.timer.timeout.connect(lambda: update_ui_from_queue(self))
+        self.timer.start(200)
+
+        self.show()
+
+
+class VerifyVersionWindow(DownloadQueueWindow):
+    window_title = "Проверка файлов"
+
+    def get_download_process_args(self) -> tuple[Any, ...]:
+        return (
+            utils.verify_version,
+            self.main_window.minecraft_directory,
+            self.main_window.versions_combobox.currentText(),
+            self.main_window.loaders_combobox.currentText(),
+            self.main_window.download_workers,
+            self.cancel_download_event,
+        )
+
+
 class SettingsWindow(QtWidgets.QDialog):
     def __init__(self):
         super().__init__(main_window)
@@ -780,6 +992,11 @@ class SettingsWindow(QtWidgets.QDialog):
         main_window.show_instances_and_packs = (
             self.instances_and_packs_checkbox.isChecked()
         )
+        main_window.thumbnails_cache_size = self.thumbnails_cache_size_spinbox.value()
+        main_window.local_catalog = self.local_catalog_checkbox.isChecked()
+        main_window.download_workers = self.download_workers_spinbox.value()
+        main_window.download_speed_limit = self.download_speed_limit_spinbox.value()
+        downloads.set_bandwidth_limit(main_window.download_speed_limit * 1024)
         return super().closeEvent(event)
 
     def reject(self):
@@ -788,7 +1005,7 @@ class SettingsWindow(QtWidgets.QDialog):
 
     def _make_ui(self):
         self.setWindowTitle("Настройки")
-        self.setFixedSize(300, 500)
+        self.setFixedSize(300, 615)
         self.setModal(True)
 
         self.java_arguments_label = QtWidgets.QLabel(self, text="java-аргументы")
@@ -907,11 +1124,62 @@ class SettingsWindow(QtWidgets.QDialog):
         self.current_minecraft_directory.setWordWrap(True)
         self.current_minecraft_directory.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
+        self.thumbnails_cache_size_label = QtWidgets.QLabel(
+            self, text="Размер кэша аватарок (МБ)"
+        )
+        self.thumbnails_cache_size_label.move(25, 385)
+        self.thumbnails_cache_size_label.setFixedWidth(250)
+        self.thumbnails_cache_size_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        self.thumbnails_cache_size_spinbox = QtWidgets.QSpinBox(self)
+        self.thumbnails_cache_size_spinbox.setRange(1, 4096)
+        self.thumbnails_cache_size_spinbox.setValue(main_window.thumbnails_cache_size)
+        self.thumbnails_cache_size_spinbox.move(100, 405)
+        self.thumbnails_cache_size_spinbox.setFixedWidth(100)
+
+        self.local_catalog_checkbox = QtWidgets.QCheckBox(self)
+        self.local_catalog_checkbox.setChecked(bool(main_window.local_catalog))
+        self.local_catalog_checkbox.setText("Локальный каталог Modrinth")
+        self.checkbox_width = self.local_catalog_checkbox.sizeHint().width()
+        self.local_catalog_checkbox.move(
+            (self.main_window_width - self.checkbox_width) // 2, 435
+        )
+
+        self.download_workers_label = QtWidgets.QLabel(
+            self, text="Одновременных загрузок"
+        )
+        self.download_workers_label.move(25, 470)
+        self.download_workers_label.setFixedWidth(250)
+        self.download_workers_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        self.download_workers_spinbox = QtWidgets.QSpinBox(self)
+        self.download_workers_spinbox.setRange(1, downloads.MAX_WORKERS)
+        self.download_workers_spinbox.setValue(main_window.download_workers)
+        self.download_workers_spinbox.move(100, 490)
+        self.download_workers_spinbox.setFixedWidth(100)
+
+        self.download_speed_limit_label = QtWidgets.QLabel(
+            self, text="Скорость загрузки проектов (КБ/с)"
+        )
+        self.download_speed_limit_label.setToolTip(
+            "Ограничение и пауза действуют на загрузку модов, сборок и других проектов. Версии игры, загрузчики и Java скачиваются без ограничений."
+        )
+        self.download_speed_limit_label.move(25, 525)
+        self.download_speed_limit_label.setFixedWidth(250)
+        self.download_speed_limit_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        self.download_speed_limit_spinbox = QtWidgets.QSpinBox(self)
+        self.download_speed_limit_spinbox.setRange(0, 1024 * 1024)
+        self.download_speed_limit_spinbox.setSpecialValueText("Без ограничения")
+        self.download_speed_limit_spinbox.setValue(main_window.download_speed_limit)
+        self.download_speed_limit_spinbox.move(75, 545)
+        self.download_speed_limit_spinbox.setFixedWidth(150)
+
         self.launcher_version_label = QtWidgets.QLabel(self)
         self.launcher_version_label.setText(
             f"Версия лаунчера: {utils.Constants.LAUNCHER_VERSION}"
         )
-        self.launcher_version_label.move(25, 450)
+        self.launcher_version_label.move(25, 585)
         self.launcher_version_label.setFixedWidth(250)
         self.launcher_version_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
@@ -1287,12 +1555,10 @@ class InstancesWindow(QtWidgets.QDialog):
                     return super().closeEvent(event)
 
             def __init__(self, parent, instance_name: str):
-                if utils.app.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier:
-                    load_icons = False
-                else:
-                    load_icons = True
-
                 super().__init__(parent)
+                self.load_icons = not (
+                    utils.app.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier
+                )
                 self.instance_name = instance_name
                 self.instance_path = os.path.join(
                     main_window.minecraft_directory, "instances", self.instance_name
@@ -1305,6 +1571,10 @@ class InstancesWindow(QtWidgets.QDialog):
                 self.scroll_area.setWidget(self.projects_container)
                 self.scroll_area.setWidgetResizable(True)
 
+                self.projects = {}
+                self.projects_titles = []
+                self._make_ui()
+
                 self.queue = multiprocessing.Queue()
                 self.progress_window = self.ProgressWindow(self)
                 self.progressbar = self.progress_window.progressbar
@@ -1315,7 +1585,10 @@ class InstancesWindow(QtWidgets.QDialog):
                         utils.search_projects,
                         main_window.minecraft_directory,
                         self.instance_name,
-                        load_icons,
+                        self.load_icons,
+                        main_window.thumbnails_cache_size * 1024 * 1024,
+                        bool(main_window.local_catalog),
+                        main_window.no_internet_connection,
                     ),
                     kwargs={"queue": self.queue},
                     daemon=True,
@@ -1325,6 +1598,21 @@ class InstancesWindow(QtWidgets.QDialog):
                 self.timer.timeout.connect(lambda: update_ui_from_queue(self))
                 self.timer.start(200)
 
+            def reject(self):
+                self.close()
+                return super().reject()
+
+            def closeEvent(self, event: QtGui.QCloseEvent):
+                self.search_projects_process.terminate()
+                return super().closeEvent(event)
+
+            def set_project_icon(self, project_id: str, icon_bytes: bytes):
+                project_info = self.projects.get(project_id)
+                if project_info is not None and "icon_label" in project_info:
+                    icon = QtGui.QPixmap()
+                    icon.loadFromData(icon_bytes)
+                    project_info["icon_label"].setPixmap(icon)
+
             def delete_project(self, project_id: str):
                 project_path = self.projects[project_id]["path"]
                 project_name = self.projects[project_id]["title"]
@@ -1345,6 +1633,7 @@ class InstancesWindow(QtWidgets.QDialog):
                         f"Прокет {project_name} был успешно удалён.",
                     )
                     self.projects[project_id]["container"].deleteLater()
+                    self.projects_titles.remove(project_name.capitalize())
                     del self.projects[project_id]
 
             def export_mrpack(self):
@@ -1507,83 +1796,80 @@ class InstancesWindow(QtWidgets.QDialog):
                     self.projects[project_id]["disabled"] = True
                 self.projects[project_id]["path"] = dst
 
-            def _make_ui(self):
-                self.setModal(True)
-                self.setWindowTitle("Управление проектами")
-                self.setFixedSize(1000, 500)
-                self.projects_len = len(self.projects.items())
-
-                self.on_off_all_button = ClickableLabel(self, text="Выключить все")
-                self.on_off_all_button.clicked.connect(self.on_off_all)
-
-                for index, (project_id, project_info) in enumerate(
-                    dict(
-                        sorted(
-                            self.projects.items(),
-                            key=lambda project: project[1]["title"].capitalize(),
-                        )
-                    ).items(),
-                    1,
-                ):
-                    project_name = project_info["title"]
-                    project_type = project_info["project_type"]
+            def add_project(self, project_id: str, project_info: dict[Any, Any]):
+                project_name = project_info["title"]
+                project_type = project_info["project_type"]
+                self.projects[project_id] = project_info
 
-                    container = QtWidgets.QWidget()
-                    h_layout = QtWidgets.QHBoxLayout(container)
-                    h_layout.setSpacing(5)
+                container = QtWidgets.QWidget()
+                h_layout = QtWidgets.QHBoxLayout(container)
+                h_layout.setSpacing(5)
 
-                    icon_bytes = project_info.get("icon_bytes")
+                if self.load_icons and project_info["icon_url"] is not None:
+                    project_icon = QtWidgets.QLabel(container)
+                    project_icon.setFixedSize(50, 50)
+                    project_info["icon_label"] = project_icon
+                    h_layout.addWidget(project_icon)
 
-                    if icon_bytes is not None:
-                        icon = QtGui.QPixmap()
-                        icon.loadFromData(icon_bytes)
-                        icon = icon.scaled(50, 50)
-                        project_icon = QtWidgets.QLabel(self)
-                        project_icon.setPixmap(icon)
-                        self.progressbar.setValue(index / self.projects_len * 100)
-                        h_layout.addWidget(project_icon)
+                project_name_label = QtWidgets.QLabel(
+                    container,
+                    text=f"{project_name} ({type_to_russian_name[project_type]})",
+                )
 
-                    project_name_label = QtWidgets.QLabel(
-                        container,
-                        text=f"{project_name} ({type_to_russian_name[project_type]})",
+                project_disabled = project_info["disabled"]
+                on_off_button = ClickableLabel(container)
+                project_info["button"] = on_off_button
+                on_off_button.clicked.connect(
+                    lambda cur_project_id=project_id,: self.on_off_project(
+                        cur_project_id
                     )
+                )
+                if project_disabled:
+                    on_off_button.setText("Включить")
+                else:
+                    on_off_button.setText("Выключить")
 
-                    project_disabled = project_info["disabled"]
-                    on_off_button = ClickableLabel(container)
-                    project_info["button"] = on_off_button
-                    on_off_button.clicked.connect(
-                        lambda cur_project_id=project_id,: self.on_off_project(
-                            cur_project_id
-                        )
+                delete_button = ClickableLabel(container, text="Удалить")
+                delete_button.clicked.connect(
+                    lambda cur_project_id=project_id: self.delete_project(
+                        cur_project_id
                     )
-                    if project_disabled:
-                        on_off_button.setText("Включить")
-                    else:
-                        on_off_button.setText("Выключить")
+                )
 
-                    delete_button = ClickableLabel(container, text="Удалить")
-                    delete_button.clicked.connect(
-                        lambda cur_project_id=project_id: self.delete_project(
-                            cur_project_id
-                        )
-                    )
+                h_layout.addWidget(project_name_label)
+                h_layout.addStretch()
+                h_layout.addWidget(on_off_button)
+                h_layout.addWidget(delete_button)
+                project_info["container"] = container
 
-                    h_layout.addWidget(project_name_label)
-                    h_layout.addStretch()
-                    h_layout.addWidget(on_off_button)
-                    h_layout.addWidget(delete_button)
-                    self.projects[project_id]["container"] = container
+                # Rows arrive in random order, keep them sorted by title
+                title_key = project_name.capitalize()
+                row_index = bisect.bisect(self.projects_titles, title_key)
+                self.projects_titles.insert(row_index, title_key)
+                self.projects_layout.insertWidget(row_index, container)
 
-                    self.projects_layout.addWidget(container)
+            def on_projects_loaded(self, other_projects_paths: list[str]):
+                self.other_projects_paths = other_projects_paths
+                self.export_mrpack_button.setEnabled(True)
+                # hide() instead of close() keeps the process loading icons alive
+                self.progress_window.hide()
+
+            def _make_ui(self):
+                self.setModal(True)
+                self.setWindowTitle("Управление проектами")
+                self.setFixedSize(1000, 500)
+
+                self.on_off_all_button = ClickableLabel(self, text="Выключить все")
+                self.on_off_all_button.clicked.connect(self.on_off_all)
 
                 self.export_mrpack_button = ClickableLabel(
                     self, text="Экспорт в .mrpack"
                 )
                 self.export_mrpack_button.clicked.connect(self.export_mrpack)
+                self.export_mrpack_button.setEnabled(False)
                 self.projects_layout.addWidget(self.on_off_all_button)
                 self.projects_layout.addWidget(self.export_mrpack_button)
 
-                self.progress_window.close()
                 self.show()
 
         def __init__(self, parent: QtWidgets.QWidget):
@@ -1766,8 +2052,12 @@ class InstancesWindow(QtWidgets.QDialog):
                     main_window.minecraft_directory,
                     mrpack_path,
                     main_window.no_internet_connection,
+                    main_window.download_workers,
                 ),
-                kwargs={"queue": self.queue},
+                kwargs={
+                    "queue": self.queue,
+                    "download_state": main_window.download_state,
+                },
                 daemon=True,
             )
             self.import_mrpack_process.start()
@@ -1837,8 +2127,24 @@ class MainWindow(QtWidgets.QMainWindow):
             self.show()
 
     def check_java(self):
-        self.java_path = minecraft_launcher_lib.utils.get_java_executable()
-        if self.java_path == "java" or self.java_path == "javaw":
+        minecraft_directory = (
+            self.saved_minecraft_directory
+            or minecraft_launcher_lib.utils.get_minecraft_directory()
+        )
+        self.java_path = runtimes.select_runtime(
+            runtimes.load_index()["runtimes"], None
+        )
+        if self.java_path is not None:
+            # Runtimes found on a previous start are trusted, the index is
+            # updated in the background for the next launches
+            threading.Thread(
+                target=runtimes.refresh_index, args=(minecraft_directory,), daemon=True
+            ).start()
+        else:
+            self.java_path = runtimes.select_runtime(
+                runtimes.refresh_index(minecraft_directory), None
+            )
+        if self.java_path is None:
             QtWidgets.QMessageBox.critical(
                 self,
                 "Java не найдена",
@@ -1869,6 +2175,10 @@ class MainWindow(QtWidgets.QMainWindow):
         show_other_versions_position: str,
         show_instances_and_packs_position: str,
         saved_minecraft_directory: str,
+        thumbnails_cache_size_position: str,
+        local_catalog_position: str,
+        download_workers_position: str,
+        download_speed_limit_position: str,
         allow_experiments: str,
         hover_color: str,
         skip_optional_mods: str,
@@ -1891,6 +2201,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self.show_other_versions_position = show_other_versions_position
         self.show_instances_and_packs_position = show_instances_and_packs_position
         self.saved_minecraft_directory = saved_minecraft_directory
+        self.thumbnails_cache_size_position = thumbnails_cache_size_position
+        self.local_catalog_position = local_catalog_position
+        self.download_workers_position = download_workers_position
+        self.download_speed_limit_position = download_speed_limit_position
         self.allow_experiments = allow_experiments
         self.hover_color = hover_color
         self.skip_optional_mods = skip_optional_mods
@@ -1993,6 +2307,10 @@ class MainWindow(QtWidgets.QMainWindow):
                 "show_other_versions": int(self.show_other_versions),
                 "show_instances_and_packs": int(self.show_instances_and_packs),
                 "minecraft_directory": self.minecraft_directory,
+                "thumbnails_cache_size": self.thumbnails_cache_size,
+                "local_catalog": int(self.local_catalog),
+                "download_workers": self.download_workers,
+                "download_speed_limit": self.download_speed_limit,
             },
             "Experiments": {
                 "allow_experiments": int(self.allow_experiments),
@@ -2071,7 +2389,11 @@ class MainWindow(QtWidgets.QMainWindow):
                     self.launch_account_type,
                     self.no_internet_connection,
                 ),
-                kwargs={"queue": self.queue, "is_game_launch_process": True},
+                kwargs={
+                    "queue": self.queue,
+                    "is_game_launch_process": True,
+                    "download_state": self.download_state,
+                },
                 daemon=True,
             )
             self.minecraft_download_process.start()
@@ -2211,6 +2533,14 @@ class MainWindow(QtWidgets.QMainWindow):
         self.show_releases = int(self.show_releases_position)
         self.show_other_versions = int(self.show_other_versions_position)
         self.show_instances_and_packs = int(self.show_instances_and_packs_position)
+        self.thumbnails_cache_size = int(self.thumbnails_cache_size_position)
+        self.local_catalog = int(self.local_catalog_position)
+        self.download_workers = int(self.download_workers_position)
+        self.download_speed_limit = int(self.download_speed_limit_position)
+        self.download_state = downloads.create_shared_state(
+            self.download_speed_limit * 1024
+        )
+        downloads.shared_state = self.download_state
 
         self.allow_experiments = int(self.allow_experiments)
         self.hover_color = self.hover_color
@@ -2274,6 +2604,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self.start_button.clicked.connect(self.on_start_button)
         self.start_button.move(20, 140)
 
+        self.verify_version_button = QtWidgets.QPushButton(self)
+        self.verify_version_button.setText("Проверить файлы версии")
+        self.verify_version_button.setFixedWidth(220)
+        self.verify_version_button.move(40, 320)
+        self.verify_version_button.clicked.connect(lambda: VerifyVersionWindow(self))
+
         self.download_projects_button = QtWidgets.QPushButton(self)
         self.download_projects_button.setText("Скачать проекты")
         self.download_projects_button.setFixedWidth(220)
@@ -2320,6 +2656,8 @@ class MainWindow(QtWidgets.QMainWindow):
             self.no_internet_connection = True
 
         logger.debug(f"No Internet connection: {self.no_internet_connection}")
+        modrinth.offline = self.no_internet_connection
+        threading.Thread(target=modrinth.prune_cache, daemon=True).start()
         self.rpc = Presence(utils.Constants.DISCORD_CLIENT_ID)
 
         if not self.no_internet_connection:
@@ -2368,6 +2706,24 @@ class MainWindow(QtWidgets.QMainWindow):
                     f"User cancelled update. Current launcher version: {utils.Constants.LAUNCHER_VERSION}"
                 )
 
+        download_jobs = downloads.load_queue()
+        if download_jobs:
+            files_count = sum(len(job["files"]) for job in download_jobs.values())
+            if (
+                QtWidgets.QMessageBox.question(
+                    self,
+                    "Незавершённые загрузки",
+                    f"Остались незавершённые загрузки ({files_count} файлов). Продолжить их?",
+                    QtWidgets.QMessageBox.StandardButton.Yes
+                    | QtWidgets.QMessageBox.StandardButton.No,
+                )
+                == QtWidgets.QMessageBox.StandardButton.Yes
+            ):
+                DownloadQueueWindow(self)
+            else:
+                for job_id in download_jobs:
+                    downloads.remove_job(job_id)
+
 
 if __name__ == "__main__":
     type_to_russian_name = {
@@ -2375,6 +2731,7 @@ if __name__ == "__main__":
         "resourcepack": "ресурспак",
         "modpack": "сборка",
         "shader": "шейдер",
+        "datapack": "датапак",
     }
     multiprocessing.freeze_support()
     open("FVLauncher.log", "w").close()
@@ -2403,6 +2760,10 @@ if __name__ == "__main__":
         config["Settings"]["show_other_versions"],
         config["Settings"]["show_instances_and_packs"],
         config["Settings"]["minecraft_directory"],
+        config["Settings"]["thumbnails_cache_size"],
+        config["Settings"]["local_catalog"],
+        config["Settings"]["download_workers"],
+        config["Settings"]["download_speed_limit"],
         config["Experiments"]["allow_experiments"],
         config["Experiments"]["hover_color"],
         config["Experiments"]["skip_optional_mods"],
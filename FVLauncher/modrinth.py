@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any
+
+import fileutils
+import requests
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.modrinth.com/v2"
+USER_AGENT = "FerrumVega/FVLauncher (https://github.com/FerrumVega/FVLauncher)"
+TIMEOUT = 10
+MAX_RETRIES = 4
+RETRY_BACKOFF = 0.5
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Below this many remaining requests, the rest are spread over the window
+RATE_LIMIT_LOW_WATERMARK = 30
+CACHE_PATH = os.path.join("cache", "modrinth")
+# Expired entries are kept as an offline fallback until unused for this long
+CACHE_MAX_UNUSED_AGE = 7 * 24 * 60 * 60
+CACHE_SIZE_LIMIT = 50 * 1024 * 1024
+CACHE_TTLS = {
+    re.compile(r"/search"): 10 * 60,
+    re.compile(r"/projects?/[^/]+"): 60 * 60,
+    re.compile(r"/projects"): 60 * 60,
+    re.compile(r"/project/[^/]+/version"): 10 * 60,
+    re.compile(r"/versions?/[^/]+"): 24 * 60 * 60,
+    re.compile(r"/versions"): 24 * 60 * 60,
+}
+
+offline = False
+
+session = requests.Session()
+session.headers["User-Agent"] = USER_AGENT
+session.mount(
+    "https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+)
+
+rate_limit_lock = threading.Lock()
+rate_limit_remaining: int | None = None
+rate_limit_reset_at = 0.0
+
+
+def wait_for_rate_limit():
+    global rate_limit_remaining
+    with rate_limit_lock:
+        reset_in = rate_limit_reset_at - time.monotonic()
+        if rate_limit_remaining is None or reset_in <= 0:
+            return
+        if rate_limit_remaining <= 0:
+            delay = reset_in
+        elif rate_limit_remaining < RATE_LIMIT_LOW_WATERMARK:
+            delay = reset_in / rate_limit_remaining
+        else:
+            delay = 0
+        # Other threads see this request before its response arrives
+        rate_limit_remaining -= 1
+    if delay:
+        logger.debug(f"Waiting {delay:.2f}s for Modrinth rate limit")
+        time.sleep(delay)
+
+
+def update_rate_limit(r: requests.Response):
+    global rate_limit_remaining, rate_limit_reset_at
+    try:
+        remaining = int(r.headers["X-Ratelimit-Remaining"])
+        reset_in = int(r.headers["X-Ratelimit-Reset"])
+    except (KeyError, ValueError):
+        return
+    with rate_limit_lock:
+        rate_limit_remaining = remaining
+        rate_limit_reset_at = time.monotonic() + reset_in
+
+
+def request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    if not url.startswith("https://"):
+        url = f"{API_URL}{url}"
+    is_api_request = url.startswith(API_URL)
+    kwargs.setdefault("timeout", TIMEOUT)
+    for attempt in range(MAX_RETRIES + 1):
+        if is_api_request:
+            wait_for_rate_limit()
+        try:
+            r = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = RETRY_BACKOFF * 2**attempt
+            logger.debug(f"{method} {url} failed ({e}), retrying in {delay}s")
+        else:
+            if is_api_request:
+                update_rate_limit(r)
+            if r.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+                return r
+            r.close()
+            if r.status_code == 429 and "X-Ratelimit-Reset" in r.headers:
+                delay = int(r.headers["X-Ratelimit-Reset"])
+            else:
+                delay = RETRY_BACKOFF * 2**attempt
+            logger.debug(
+                f"{method} {url} returned {r.status_code}, retrying in {delay}s"
+            )
+        time.sleep(delay)
+
+
+def get_cache_ttl(path: str) -> int | None:
+    for pattern, ttl in CACHE_TTLS.items():
+        if pattern.fullmatch(path):
+            return ttl
+    return None
+
+
+def get_cache_path(path: str, params: dict[str, Any] | None) -> str:
+    cache_key = json.dumps([path, params], sort_keys=True)
+    return os.path.join(
+        CACHE_PATH, f"{hashlib.sha256(cache_key.encode()).hexdigest()}.json"
+    )
+
+
+def read_cache(cache_path: str) -> dict[str, Any] | None:
+    try:
+        with open(cache_path, encoding="utf-8") as cache_file:
+            return json.load(cache_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_cache(cache_path: str, cache_entry: dict[str, Any]):
+    fileutils.write_json_atomically(cache_path, cache_entry)
+
+
+def prune_cache():
+    # The mtime of an entry is its last use, see get
+    try:
+        cache_files = [
+            cache_file
+            for cache_file in os.scandir(CACHE_PATH)
+            if cache_file.name.endswith(".json")
+        ]
+    except FileNotFoundError:
+        return
+    now = time.time()
+    kept_files = []
+    removed_count = 0
+    for cache_file in cache_files:
+        try:
+            stat = cache_file.stat()
+            if now - stat.st_mtime > CACHE_MAX_UNUSED_AGE:
+                os.remove(cache_file.path)
+                removed_count += 1
+            else:
+                kept_files.append((stat.st_mtime, stat.st_size, cache_file.path))
+        except FileNotFoundError:
+            continue
+    cache_size = sum(size for _, size, _ in kept_files)
+    for _, size, path in sorted(kept_files):
+        if cache_size <= CACHE_SIZE_LIMIT:
+            break
+        try:
+            os.remove(path)
+            removed_count += 1
+        except FileNotFoundError:
+            pass
+        cache_size -= size
+    logger.debug(f"Pruned {removed_count} Modrinth cache entries")
+
+
+def get(path: str, params: dict[str, Any] | None = None) -> Any:
+    cache_ttl = get_cache_ttl(path)
+    if cache_ttl is None:
+        with request("GET", path, params=params) as r:
+            r.raise_for_status()
+            return r.json()
+
+    cache_path = get_cache_path(path, params)
+    cache_entry = read_cache(cache_path)
+    if cache_entry is not None and (
+        offline or time.time() - cache_entry["fetched_at"] < cache_ttl
+    ):
+        try:
+            os.utime(cache_path)
+        except FileNotFoundError:
+            pass
+        return cache_entry["data"]
+    if cache_entry is None and offline:
+        raise requests.ConnectionError(f"{path} is not cached and there is no Internet")
+
+    headers = {}
+    if cache_entry is not None:
+        if cache_entry["etag"] is not None:
+            headers["If-None-Match"] = cache_entry["etag"]
+        if cache_entry["last_modified"] is not None:
+            headers["If-Modified-Since"] = cache_entry["last_modified"]
+    try:
+        with request("GET", path, params=params, headers=headers) as r:
+            r.raise_for_status()
+            if r.status_code == 304 and cache_entry is not None:
+                cache_entry["fetched_at"] = time.time()
+            else:
+                cache_entry = {
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                    "fetched_at": time.time(),
+                    "data": r.json(),
+                }
+    except (requests.ConnectionError, requests.Timeout) as e:
+        if cache_entry is None:
+            raise
+        logger.debug(f"Using stale cache of {path} ({e})")
+        return cache_entry["data"]
+    write_cache(cache_path, cache_entry)
+    return cache_entry["data"]
+
+
+def post(path: str, json: Any) -> Any:
+    with request("POST", path, json=json) as r:
+        r.raise_for_status()
+        return r.json()
@@ -0,0 +1,199 @@
+import glob
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import threading
+import time
+from typing import Any
+
+import fileutils
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = os.path.join("cache", "java_runtimes.json")
+PROBE_TIMEOUT = 10
+JAVA_EXECUTABLE = "java.exe" if platform.system() == "Windows" else "java"
+DEFAULT_MAJOR_VERSION = 8
+SEARCH_PATTERNS = {
+    "Windows": [
+        os.path.join(program_files, vendor_directory, "*")
+        for program_files in {
+            os.environ.get("ProgramFiles", r"C:\Program Files"),
+            os.environ.get("ProgramFiles(x86)", r"C:\Program Files (x86)"),
+        }
+        for vendor_directory in (
+            "Java",
+            "Eclipse Adoptium",
+            "Eclipse Foundation",
+            "AdoptOpenJDK",
+            "Zulu",
+            "Microsoft",
+            "BellSoft",
+            "Amazon Corretto",
+            "Semeru",
+        )
+    ],
+    "Linux": [
+        "/usr/lib/jvm/*",
+        "/usr/java/*",
+        "/opt/java/*",
+        os.path.expanduser("~/.sdkman/candidates/java/*"),
+    ],
+    "Darwin": [
+        "/Library/Java/JavaVirtualMachines/*/Contents/Home",
+        os.path.expanduser("~/Library/Java/JavaVirtualMachines/*/Contents/Home"),
+    ],
+}
+
+index_lock = threading.Lock()
+
+
+def load_index() -> dict[str, Any]:
+    try:
+        with open(INDEX_PATH, encoding="utf-8") as index_file:
+            return json.load(index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"refreshed_at": 0, "runtimes": {}}
+
+
+def save_index(runtimes_index: dict[str, Any]):
+    fileutils.write_json_atomically(INDEX_PATH, runtimes_index)
+
+
+def find_java_executables(minecraft_directory: str) -> dict[str, bool]:
+    java_homes = [
+        (java_home, False)
+        for pattern in SEARCH_PATTERNS.get(platform.system(), [])
+        for java_home in glob.glob(pattern)
+    ]
+    if os.getenv("JAVA_HOME"):
+        java_homes.append((os.environ["JAVA_HOME"], False))
+    # Runtimes installed by the launcher for Mojang's javaVersion components
+    java_homes += [
+        (java_home, True)
+        for pattern in ("*/*/*", "*/*/*/jre.bundle/Contents/Home")
+        for java_home in glob.glob(
+            os.path.join(glob.escape(minecraft_directory), "runtime", pattern)
+        )
+    ]
+
+    java_executables = {}
+    java_on_path = shutil.which("java")
+    if java_on_path is not None:
+        java_executables[os.path.realpath(java_on_path)] = False
+    for java_home, bundled in java_homes:
+        java_path = os.path.join(java_home, "bin", JAVA_EXECUTABLE)
+        if os.path.isfile(java_path):
+            java_executables[os.path.realpath(java_path)] = bundled
+    return java_executables
+
+
+def get_major_version(version: str) -> int:
+    version_parts = re.findall(r"\d+", version)
+    if not version_parts:
+        return 0
+    # 1.8.0_382 is Java 8, 17.0.8 is Java 17
+    if version_parts[0] == "1" and len(version_parts) > 1:
+        return int(version_parts[1])
+    return int(version_parts[0])
+
+
+def read_release_file(java_path: str) -> dict[str, str]:
+    release = {}
+    release_path = os.path.join(os.path.dirname(os.path.dirname(java_path)), "release")
+    try:
+        with open(release_path, encoding="utf-8", errors="replace") as release_file:
+            for line in release_file:
+                key, separator, value = line.partition("=")
+                if separator:
+                    release[key.strip()] = value.strip().strip('"')
+    except FileNotFoundError:
+        pass
+    return release
+
+
+def probe_runtime(java_path: str) -> dict[str, Any] | None:
+    # The release file next to bin/ has everything without starting a JVM
+    release = read_release_file(java_path)
+    if "JAVA_VERSION" in release:
+        version = release["JAVA_VERSION"]
+        vendor = release.get("IMPLEMENTOR", "")
+        architecture = release.get("OS_ARCH", "")
+    else:
+        try:
+            output = subprocess.run(
+                [java_path, "-XshowSettings:properties", "-version"],
+                check=False,
+                capture_output=True,
+                text=True,
+                timeout=PROBE_TIMEOUT,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            ).stderr
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.debug(f"Failed to probe {java_path}: {e}")
+            return None
+        properties = dict(re.findall(r"^\s*([\w.]+) = (.*)$", output, re.MULTILINE))
+        if "java.version" not in properties:
+            return None
+        version = properties["java.version"]
+        vendor = properties.get("java.vendor", "")
+        architecture = properties.get("os.arch", "")
+    return {
+        "version": version,
+        "major_version": get_major_version(version),
+        "vendor": vendor,
+        "architecture": architecture,
+    }
+
+
+def refresh_index(minecraft_directory: str) -> dict[str, dict[str, Any]]:
+    with index_lock:
+        old_runtimes = load_index()["runtimes"]
+        java_runtimes = {}
+        for java_path, bundled in find_java_executables(minecraft_directory).items():
+            mtime = os.stat(java_path).st_mtime_ns
+            java_runtime = old_runtimes.get(java_path)
+            if java_runtime is None or java_runtime["mtime"] != mtime:
+                java_runtime = probe_runtime(java_path)
+                if java_runtime is None:
+                    continue
+            java_runtimes[java_path] = {
+                **java_runtime,
+                "mtime": mtime,
+                "bundled": bundled,
+            }
+        save_index({"refreshed_at": time.time(), "runtimes": java_runtimes})
+    logger.debug(f"Found {len(java_runtimes)} Java runtimes")
+    return java_runtimes
+
+
+def get_version_sort_key(java_runtime: dict[str, Any]) -> tuple[int, ...]:
+    return tuple(int(part) for part in re.findall(r"\d+", java_runtime["version"]))
+
+
+def select_runtime(
+    java_runtimes: dict[str, dict[str, Any]], major_version: int | None
+) -> str | None:
+    # Only the required major version is accepted, a newer one may be unable to
+    # run the game (Java 8 versions on 17+). None accepts any runtime.
+    # Runtimes installed for Minecraft and 64-bit ones go first
+    candidates = [
+        java_path
+        for java_path, java_runtime in java_runtimes.items()
+        if (major_version is None or java_runtime["major_version"] == major_version)
+        and os.path.isfile(java_path)
+    ]
+    if not candidates:
+        return None
+    return min(
+        candidates,
+        key=lambda java_path: (
+            not java_runtimes[java_path]["bundled"],
+            "64" not in java_runtimes[java_path]["architecture"],
+            tuple(-part for part in get_version_sort_key(java_runtimes[java_path])),
+        ),
+    )
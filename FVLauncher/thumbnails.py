@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any
+
+import fileutils
+import requests
+from PySide6 import QtCore, QtGui
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.path.join("cache", "thumbnails")
+INDEX_PATH = os.path.join(CACHE_PATH, "index.json")
+THUMBNAIL_SIZES = (50, 100)
+REVALIDATE_INTERVAL = 24 * 60 * 60
+
+index_lock = threading.Lock()
+index: dict[str, dict[str, Any]] | None = None
+evicted_urls: set[str] = set()
+
+
+def load_index() -> dict[str, dict[str, Any]]:
+    global index
+    if index is None:
+        try:
+            with open(INDEX_PATH, encoding="utf-8") as index_file:
+                index = json.load(index_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+    return index
+
+
+def save_index():
+    with index_lock:
+        if index is None:
+            return
+        os.makedirs(CACHE_PATH, exist_ok=True)
+        # Another process may have cached icons since we loaded the index
+        try:
+            with open(INDEX_PATH, encoding="utf-8") as index_file:
+                saved_index = json.load(index_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            saved_index = {}
+        for icon_url in evicted_urls:
+            saved_index.pop(icon_url, None)
+        for icon_url, icon_info in index.items():
+            if (
+                icon_url not in saved_index
+                or saved_index[icon_url]["last_used"] <= icon_info["last_used"]
+            ):
+                saved_index[icon_url] = icon_info
+        # Search, prefetch and project windows save from different processes
+        fileutils.write_json_atomically(INDEX_PATH, saved_index)
+        index.update(saved_index)
+        evicted_urls.clear()
+
+
+def thumbnail_path(content_hash: str, size: int) -> str:
+    return os.path.join(CACHE_PATH, f"{content_hash}_{size}.png")
+
+
+def read_thumbnail(icon_info: dict[str, Any], size: int) -> bytes | None:
+    try:
+        with open(thumbnail_path(icon_info["content_hash"], size), "rb") as fp:
+            return fp.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_thumbnails(content: bytes, content_hash: str) -> int | None:
+    image = QtGui.QImage.fromData(content)
+    if image.isNull():
+        return None
+    os.makedirs(CACHE_PATH, exist_ok=True)
+    thumbnails_size = 0
+    for size in THUMBNAIL_SIZES:
+        path = thumbnail_path(content_hash, size)
+        if not os.path.isfile(path):
+            thumbnail_bytes = QtCore.QByteArray()
+            thumbnail_buffer = QtCore.QBuffer(thumbnail_bytes)
+            thumbnail_buffer.open(QtCore.QIODevice.OpenModeFlag.WriteOnly)
+            image.scaled(
+                size,
+                size,
+                QtCore.Qt.AspectRatioMode.IgnoreAspectRatio,
+                QtCore.Qt.TransformationMode.SmoothTransformation,
+            ).save(thumbnail_buffer, "PNG")
+            fileutils.write_file_atomically(path, thumbnail_bytes.data())
+        thumbnails_size += os.path.getsize(path)
+    return thumbnails_size
+
+
+def evict(cache_size_limit: int):
+    sizes_by_hash = {
+        icon_info["content_hash"]: icon_info["size"] for icon_info in index.values()
+    }
+    cache_size = sum(sizes_by_hash.values())
+    for icon_url, icon_info in sorted(
+        index.items(), key=lambda item: item[1]["last_used"]
+    ):
+        if cache_size <= cache_size_limit:
+            break
+        del index[icon_url]
+        evicted_urls.add(icon_url)
+        content_hash = icon_info["content_hash"]
+        if all(
+            other_info["content_hash"] != content_hash for other_info in index.values()
+        ):
+            cache_size -= sizes_by_hash[content_hash]
+            for size in THUMBNAIL_SIZES:
+                try:
+                    os.remove(thumbnail_path(content_hash, size))
+                except FileNotFoundError:
+                    pass
+            logger.debug(f"Evicted thumbnail of {icon_url}")
+
+
+def get_thumbnail(
+    icon_url: str,
+    size: int,
+    cache_size_limit: int,
+    session: requests.Session | None = None,
+    offline: bool = False,
+) -> bytes | None:
+    with index_lock:
+        icon_info = load_index().get(icon_url)
+        if icon_info is not None:
+            icon_info["last_used"] = time.time()
+            thumbnail_bytes = read_thumbnail(icon_info, size)
+            if thumbnail_bytes is not None and (
+                offline or time.time() - icon_info["checked_at"] < REVALIDATE_INTERVAL
+            ):
+                return thumbnail_bytes
+        else:
+            thumbnail_bytes = None
+    if offline:
+        raise requests.ConnectionError(
+            f"{icon_url} is not cached and there is no Internet"
+        )
+
+    headers = {}
+    if thumbnail_bytes is not None and icon_info["etag"] is not None:
+        headers["If-None-Match"] = icon_info["etag"]
+    try:
+        with (session or requests).get(icon_url, headers=headers, timeout=10) as r:
+            if r.status_code == 304 and thumbnail_bytes is not None:
+                with index_lock:
+                    icon_info["checked_at"] = time.time()
+                return thumbnail_bytes
+            r.raise_for_status()
+            content = r.content
+            etag = r.headers.get("ETag")
+    except requests.RequestException as e:
+        if thumbnail_bytes is not None:
+            logger.debug(f"Using stale thumbnail of {icon_url}: {e}")
+            return thumbnail_bytes
+        raise
+
+    content_hash = hashlib.sha256(content).hexdigest()
+    thumbnails_size = write_thumbnails(content, content_hash)
+    if thumbnails_size is None:
+        logger.debug(f"Icon {icon_url} is not an image supported by Qt")
+        return None
+    with index_lock:
+        index[icon_url] = {
+            "content_hash": content_hash,
+            "etag": etag,
+            "checked_at": time.time(),
+            "last_used": time.time(),
+            "size": thumbnails_size,
+        }
+        evicted_urls.discard(icon_url)
+        thumbnail_bytes = read_thumbnail(index[icon_url], size)
+        evict(cache_size_limit)
+    return thumbnail_bytes
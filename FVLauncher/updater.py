@@ -1,6 +1,8 @@
+import os
 import subprocess
 import tempfile
 
+import downloads
 import requests
 
 
@@ -16,19 +18,16 @@ def is_new_version_released(current_version):
 
 
 def update():
-    with (
-        tempfile.NamedTemporaryFile(
-            prefix="FVLInstaller_", suffix=".exe", delete=False
-        ) as launcher_installer_file,
-        requests.get(
-            "https://github.com/FerrumVega/FVLauncher/releases/latest/download/FVLauncher_Installer.exe",
-            timeout=10,
-        ) as r,
-    ):
-        r.raise_for_status()
-        launcher_installer_file.write(r.content)
+    launcher_installer_path = os.path.join(
+        tempfile.mkdtemp(prefix="FVLInstaller_"), "FVLauncher_Installer.exe"
+    )
+    downloads.download(
+        "https://github.com/FerrumVega/FVLauncher/releases/latest/download/FVLauncher_Installer.exe",
+        launcher_installer_path,
+        None,
+    )
 
     subprocess.Popen(
-        [launcher_installer_file.name],
+        [launcher_installer_path],
         creationflags=subprocess.CREATE_NO_WINDOW,
     )
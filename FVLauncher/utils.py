@@ -1,21 +1,35 @@
 import hashlib
 import json
+import locale
 import logging
 import os
+import platform
 import random
 import string
 import subprocess
 import sys
+import threading
 import time
 import traceback
 import uuid
-from collections.abc import Callable, Iterable
+import zipfile
+from collections.abc import Callable, Iterable, Mapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from multiprocessing.queues import Queue
-from typing import Any
+from multiprocessing.synchronize import Event
+from typing import Any, ClassVar
 
+import artifacts
+import catalog
+import downloads
+import fileutils
 import minecraft_launcher_lib
+import modrinth
 import optipy
 import requests
+import runtimes
+import thumbnails
+import versions
 from defusedxml import ElementTree as ET
 from faker import Faker
 from pypresence.presence import Presence
@@ -38,6 +52,46 @@ class Constants:
     LAUNCHER_VERSION = "v8.6"
     USER_AGENT = Faker().user_agent()
 
+    HASH_INDEX_FILENAME = "projects_hashes.json"
+    UNKNOWN_HASH_RECHECK_INTERVAL = 7 * 24 * 60 * 60
+    HASH_BUFFER_SIZE = 1024 * 1024
+    ICON_FETCH_WORKERS = 8
+    MODRINTH_LOOKUP_WORKERS = 4
+    VERSION_FILES_BATCH_SIZE = 200
+    PROJECTS_BATCH_SIZE = 100
+    SEARCH_PAGE_SIZE = 20
+    SEARCH_PAGE_PRELOAD_DISTANCE = 100
+    SEARCH_DEBOUNCE_MS = 300
+    PREFETCH_TOP_HITS = 5
+    PREFETCH_CACHE_SIZE = 50
+    PREFETCH_WORKERS = 4
+    DOWNLOAD_CANCEL_TIMEOUT = 2
+    AUTHLIB_CACHE_PATH = os.path.join("cache", "authlib")
+    AUTHLIB_METADATA_TTL = 24 * 60 * 60
+    OPTIFINE_CACHE_PATH = os.path.join("cache", "optifine")
+    OPTIFINE_LOOKUP_TTL = 24 * 60 * 60
+    COMMAND_CACHE_PATH = os.path.join("cache", "commands")
+    VERSION_INDEX_PATH = os.path.join("cache", "version_index.json")
+    # Bumped when the entries change, so older indexes are rebuilt
+    VERSION_INDEX_FORMAT = 2
+    # neoforge goes first, its folder names contain "forge" too
+    VERSION_LOADERS = ("neoforge", "forge", "fabric", "quilt")
+    VERIFY_INDEX_FILENAME = "verified_files.json"
+    VERIFY_WORKERS = 8
+    ASSETS_URL = "https://resources.download.minecraft.net"
+    RULE_OS_NAMES: ClassVar[dict[str, str]] = {
+        "Windows": "windows",
+        "Darwin": "osx",
+        "Linux": "linux",
+    }
+    ARGFILE_MIN_JAVA_VERSION = 9
+    # Account values are left out of cached commands and filled in on launch
+    COMMAND_PLACEHOLDERS: ClassVar[dict[str, str]] = {
+        "username": "${fvl_username}",
+        "uuid": "${fvl_uuid}",
+        "token": "${fvl_token}",
+    }
+
 
 app = QtWidgets.QApplication(sys.argv)
 app.setStyle(QtWidgets.QStyleFactory.create("windows11"))
@@ -50,12 +104,49 @@ window_icon = QtGui.QIcon(
 )
 
 
+def load_hash_index(instance_path: str) -> dict[str, dict[str, Any]]:
+    try:
+        with open(
+            os.path.join(instance_path, Constants.HASH_INDEX_FILENAME), encoding="utf-8"
+        ) as hash_index_file:
+            return json.load(hash_index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_hash_index(instance_path: str, hash_index: dict[str, dict[str, Any]]):
+    fileutils.write_json_atomically(
+        os.path.join(instance_path, Constants.HASH_INDEX_FILENAME), hash_index
+    )
+
+
+def hash_file(path: str, algorithm: str = "sha512") -> str:
+    file_hash = hashlib.new(algorithm)
+    buffer = bytearray(Constants.HASH_BUFFER_SIZE)
+    buffer_view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as fp:
+        while read_size := fp.readinto(buffer):
+            file_hash.update(buffer_view[:read_size])
+    return file_hash.hexdigest()
+
+
 def search_projects(
-    minecraft_directory: str, instance_name: str, load_icons: bool, queue: Queue
+    minecraft_directory: str,
+    instance_name: str,
+    load_icons: bool,
+    thumbnails_cache_size: int,
+    use_catalog: bool,
+    offline: bool,
+    queue: Queue,
 ):
+    # Module state of the main process is not inherited by this one
+    modrinth.offline = offline
     queue.put(("status", "Вычиление хэшей"))
-    hashes_and_paths = {}
     instance_path = os.path.join(minecraft_directory, "instances", instance_name)
+    old_hash_index = load_hash_index(instance_path)
+    hash_index = {}
+    paths_and_index_keys = {}
+    files_to_hash = {}
     for project_type_folder in [
         "mods",
         "resourcepacks",
@@ -63,65 +154,229 @@ def search_projects(
         "shaderpacks",
     ]:
         try:
-            for filename in os.listdir(
-                os.path.join(instance_path, project_type_folder)
-            ):
-                path = os.path.join(instance_path, project_type_folder, filename)
-                with open(path, "rb") as fp:
-                    hashes_and_paths[hashlib.file_digest(fp, "sha512").hexdigest()] = (
-                        path
-                    )
+            for entry in os.scandir(os.path.join(instance_path, project_type_folder)):
+                if not entry.is_file():
+                    continue
+                index_key = f"{project_type_folder}/{entry.name}"
+                paths_and_index_keys[entry.path] = index_key
+                stat = entry.stat()
+                # Enabling/disabling a project renames it but keeps size and mtime
+                file_info = old_hash_index.get(index_key) or old_hash_index.get(
+                    index_key.removesuffix(".disabled")
+                    if index_key.endswith(".disabled")
+                    else f"{index_key}.disabled"
+                )
+                if (
+                    file_info is None
+                    or file_info["size"] != stat.st_size
+                    or file_info["mtime_ns"] != stat.st_mtime_ns
+                ):
+                    files_to_hash[entry.path] = stat
+                else:
+                    hash_index[index_key] = file_info
         except FileNotFoundError:
             pass
-    queue.put(("status", "Поиск файлов версий"))
-    with requests.post(
-        "https://api.modrinth.com/v2/version_files",
-        json={
-            "hashes": list(hashes_and_paths.keys()),
-            "algorithm": "sha512",
-        },
-    ) as r:
-        r.raise_for_status()
-        projects = {}
-        for project_hash, project_info in r.json().items():
-            projects[project_info["project_id"]] = project_info
-            projects[project_info["project_id"]]["path"] = hashes_and_paths[
-                project_hash
-            ]
-            del hashes_and_paths[project_hash]
-    with requests.get(
-        "https://api.modrinth.com/v2/projects",
-        params={"ids": json.dumps(list(projects.keys()))},
-    ) as r:
-        r.raise_for_status()
-        full_projects = r.json()
-        projects_len = len(full_projects)
-        for index, project_info in enumerate(full_projects, 1):
-            project_name = project_info["title"]
-            project_id = project_info["id"]
-            projects[project_id]["title"] = project_name
-            projects[project_id]["project_type"] = project_info["project_type"]
-            projects[project_id]["disabled"] = projects[project_id]["path"].endswith(
-                ".disabled"
-            )
-            if load_icons and (icon_url := project_info.get("icon_url")) is not None:
-                with requests.get(icon_url, timeout=10) as r:
-                    r.raise_for_status()
-                    projects[project_id]["icon_bytes"] = r.content
-            else:
-                projects[project_id]["icon_bytes"] = None
-            logger.debug(f"Doing smth with {project_name} ({index}/{projects_len})")
-            queue.put(("progressbar", index / projects_len * 100))
-            queue.put(("status", f"Работа с {project_name}"))
-    queue.put(("projects", projects, list(hashes_and_paths.values())))
 
+    hashes_and_paths = {}
+    hashes_and_index_keys = {}
+    unsent_hashes = []
+    other_projects_paths = []
+    projects = {}
+    files_to_hash_size = sum(stat.st_size for stat in files_to_hash.values())
+    hashed_size = 0
+    looked_up_hashes_len = 0
+
+    def add_file(path: str, file_info: dict[str, Any]):
+        if (
+            file_info["unknown_since"] is not None
+            and time.time() - file_info["unknown_since"]
+            < Constants.UNKNOWN_HASH_RECHECK_INTERVAL
+        ):
+            other_projects_paths.append(path)
+        elif file_info["sha512"] not in hashes_and_paths:
+            hashes_and_paths[file_info["sha512"]] = path
+            hashes_and_index_keys[file_info["sha512"]] = paths_and_index_keys[path]
+            unsent_hashes.append(file_info["sha512"])
 
-def track_progress_factory(queue: Queue):
+    # Hashing, Modrinth lookups and icon downloads run as one pipeline, so the
+    # first projects are sent to the window long before the whole instance is
+    # hashed
+    with (
+        ThreadPoolExecutor(max_workers=os.cpu_count()) as hash_executor,
+        ThreadPoolExecutor(max_workers=Constants.MODRINTH_LOOKUP_WORKERS) as executor,
+        ThreadPoolExecutor(max_workers=Constants.ICON_FETCH_WORKERS) as icon_executor,
+    ):
+        futures = {}
+        projects_loaded = False
+        for path, index_key in paths_and_index_keys.items():
+            if index_key in hash_index:
+                add_file(path, hash_index[index_key])
+        for path in files_to_hash:
+            futures[hash_executor.submit(hash_file, path)] = ("hash", path)
+
+        while True:
+            hashing = any(future_type == "hash" for future_type, _ in futures.values())
+            while len(unsent_hashes) >= Constants.VERSION_FILES_BATCH_SIZE or (
+                unsent_hashes and not hashing
+            ):
+                hashes_batch = unsent_hashes[: Constants.VERSION_FILES_BATCH_SIZE]
+                del unsent_hashes[: Constants.VERSION_FILES_BATCH_SIZE]
+                futures[
+                    executor.submit(fetch_version_files, hashes_batch, use_catalog)
+                ] = (
+                    "version_files",
+                    hashes_batch,
+                )
+            if not projects_loaded and all(
+                future_type == "icon" for future_type, _ in futures.values()
+            ):
+                projects_loaded = True
+                save_hash_index(instance_path, hash_index)
+                queue.put(("projects_loaded", other_projects_paths))
+            if not futures:
+                break
+
+            done_futures, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                future_type, future_info = futures.pop(future)
+                match future_type:
+                    case "hash":
+                        stat = files_to_hash[future_info]
+                        hash_index[paths_and_index_keys[future_info]] = {
+                            "size": stat.st_size,
+                            "mtime_ns": stat.st_mtime_ns,
+                            "sha512": future.result(),
+                            "unknown_since": None,
+                        }
+                        add_file(
+                            future_info, hash_index[paths_and_index_keys[future_info]]
+                        )
+                        hashed_size += stat.st_size
+                        queue.put((
+                            "progressbar",
+                            hashed_size / max(files_to_hash_size, 1) * 100,
+                        ))
+                        queue.put((
+                            "status",
+                            f"Вычисление хэша {os.path.basename(future_info)}",
+                        ))
+                    case "version_files":
+                        version_files, from_network = future.result()
+                        new_project_ids = []
+                        for project_hash in future_info:
+                            file_info = hash_index[hashes_and_index_keys[project_hash]]
+                            if project_hash not in version_files:
+                                # The local catalog only knows files seen before
+                                if from_network:
+                                    file_info["unknown_since"] = time.time()
+                                other_projects_paths.append(
+                                    hashes_and_paths[project_hash]
+                                )
+                                continue
+                            file_info["unknown_since"] = None
+                            project_info = version_files[project_hash]
+                            if project_info["project_id"] not in projects:
+                                new_project_ids.append(project_info["project_id"])
+                                projects[project_info["project_id"]] = project_info
+                                project_info["path"] = hashes_and_paths[project_hash]
+                        for i in range(
+                            0, len(new_project_ids), Constants.PROJECTS_BATCH_SIZE
+                        ):
+                            futures[
+                                executor.submit(
+                                    fetch_projects,
+                                    new_project_ids[
+                                        i : i + Constants.PROJECTS_BATCH_SIZE
+                                    ],
+                                    use_catalog,
+                                )
+                            ] = ("projects", None)
+                        looked_up_hashes_len += len(future_info)
+                        if not hashing:
+                            queue.put((
+                                "progressbar",
+                                looked_up_hashes_len / len(hashes_and_paths) * 100,
+                            ))
+                            queue.put(("status", "Получение информации о проектах"))
+                    case "projects":
+                        for full_project_info in future.result():
+                            project_id = full_project_info["id"]
+                            project_info = projects[project_id]
+                            project_info["title"] = full_project_info["title"]
+                            project_info["project_type"] = full_project_info[
+                                "project_type"
+                            ]
+                            project_info["icon_url"] = full_project_info.get("icon_url")
+                            project_info["disabled"] = project_info["path"].endswith(
+                                ".disabled"
+                            )
+                            queue.put(("project", project_id, project_info))
+                            if load_icons and project_info["icon_url"] is not None:
+                                futures[
+                                    icon_executor.submit(
+                                        thumbnails.get_thumbnail,
+                                        project_info["icon_url"],
+                                        50,
+                                        thumbnails_cache_size,
+                                        modrinth.session,
+                                    )
+                                ] = ("icon", project_id)
+                    case "icon":
+                        try:
+                            icon_bytes = future.result()
+                        except requests.RequestException as e:
+                            logger.debug(
+                                f"Failed to load icon of {future_info} project: {e}"
+                            )
+                        else:
+                            if icon_bytes is not None:
+                                queue.put(("project_icon", future_info, icon_bytes))
+    thumbnails.save_index()
+
+
+def fetch_version_files(
+    hashes: list[str], use_catalog: bool = False
+) -> tuple[dict[str, dict[str, Any]], bool]:
+    if use_catalog and modrinth.offline:
+        return catalog.get_version_files(hashes), False
+    try:
+        version_files = modrinth.post(
+            "/version_files", {"hashes": hashes, "algorithm": "sha512"}
+        )
+    except (requests.ConnectionError, requests.Timeout) as e:
+        if not use_catalog:
+            raise
+        logger.debug(f"Using local catalog for version files: {e}")
+        return catalog.get_version_files(hashes), False
+    if use_catalog:
+        catalog.add_version_files(version_files)
+    return version_files, True
+
+
+def fetch_projects(
+    project_ids: list[str], use_catalog: bool = False
+) -> list[dict[str, Any]]:
+    try:
+        projects = modrinth.get("/projects", {"ids": json.dumps(project_ids)})
+    except (requests.ConnectionError, requests.Timeout) as e:
+        if not use_catalog:
+            raise
+        logger.debug(f"Using local catalog for projects: {e}")
+        return catalog.get_projects(project_ids)
+    if use_catalog:
+        catalog.add_projects(projects)
+    return projects
+
+
+def track_progress_factory(queue: Queue, priority: int | None = None):
     progress: int = 0
     max_progress: int = 100
 
     def track_progress(value: str | int, progress_type: str):
         nonlocal progress, max_progress
+        # Installs by minecraft_launcher_lib only report progress between files
+        if priority is not None:
+            downloads.heartbeat(priority)
         if progress_type != "progress_info":
             if progress_type == "progress":
                 progress = value
@@ -158,8 +413,11 @@ def run_in_process_with_exceptions_logging(
     *args: Any,
     queue: Queue,
     is_game_launch_process: bool = False,
+    download_state: dict[str, Any] | None = None,
     **kwargs: Any,
 ):
+    if download_state is not None:
+        downloads.shared_state = download_state
     try:
         func(*args, queue, **kwargs)
     except Exception as e:  # noqa: BLE001
@@ -185,6 +443,7 @@ def download_instance_from_mrpack(
     minecraft_directory: str,
     mrpack_path: str,
     no_internet_connection: bool,
+    max_workers: int,
     queue: Queue,
 ):
     track_progress = track_progress_factory(queue)
@@ -199,6 +458,32 @@ def download_instance_from_mrpack(
             "instances",
             folder_name,
         )
+        # install_mrpack skips files that are already in place with the right
+        # sha1, so it is left to extract overrides and install the loader
+        with (
+            zipfile.ZipFile(mrpack_path) as mrpack,
+            mrpack.open("modrinth.index.json") as index_file,
+        ):
+            mrpack_files = json.load(index_file)["files"]
+        artifacts.install_files(
+            [
+                {
+                    "url": mrpack_file["downloads"][0],
+                    "path": os.path.join(instance_path, mrpack_file["path"]),
+                    "size": mrpack_file.get("fileSize"),
+                    "hashes": mrpack_file["hashes"],
+                }
+                for mrpack_file in mrpack_files
+                if mrpack_file.get("env", {}).get("client", "required") == "required"
+                and os.path.abspath(
+                    os.path.join(instance_path, mrpack_file["path"])
+                ).startswith(os.path.abspath(instance_path) + os.sep)
+            ],
+            minecraft_directory,
+            max_workers,
+            queue,
+            threading.Event(),
+        )
         minecraft_launcher_lib.mrpack.install_mrpack(
             mrpack_path,
             minecraft_directory,
@@ -262,6 +547,58 @@ def prepare_installation_parameters(
     return install_type, options
 
 
+def load_authlib_index() -> dict[str, Any]:
+    try:
+        with open(
+            os.path.join(Constants.AUTHLIB_CACHE_PATH, "index.json"), encoding="utf-8"
+        ) as index_file:
+            return json.load(index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"metadata_fetched_at": 0, "jars": {}}
+
+
+def save_authlib_index(authlib_index: dict[str, Any]):
+    fileutils.write_json_atomically(
+        os.path.join(Constants.AUTHLIB_CACHE_PATH, "index.json"), authlib_index
+    )
+
+
+def get_ely_maven_metadata(
+    base_url: str, authlib_index: dict[str, Any], force_refresh: bool = False
+) -> str:
+    metadata_path = os.path.join(Constants.AUTHLIB_CACHE_PATH, "maven-metadata.xml")
+    if (
+        not force_refresh
+        and os.path.isfile(metadata_path)
+        and time.time() - authlib_index["metadata_fetched_at"]
+        < Constants.AUTHLIB_METADATA_TTL
+    ):
+        with open(metadata_path, encoding="utf-8") as metadata_file:
+            return metadata_file.read()
+    try:
+        with requests.get(f"{base_url}/maven-metadata.xml", timeout=10) as r:
+            r.raise_for_status()
+            maven_metadata = r.text
+    except requests.RequestException as e:
+        if not os.path.isfile(metadata_path):
+            raise
+        logger.debug(f"Using stale maven metadata of authlib: {e}")
+        with open(metadata_path, encoding="utf-8") as metadata_file:
+            return metadata_file.read()
+    fileutils.write_file_atomically(metadata_path, maven_metadata)
+    authlib_index["metadata_fetched_at"] = time.time()
+    return maven_metadata
+
+
+def find_ely_authlib_version(maven_metadata: str, authlib_version: str) -> str | None:
+    for maven_version in ET.fromstring(maven_metadata).findall(
+        "./versioning/versions/version"
+    )[::-1]:
+        if authlib_version in maven_version.text:
+            return maven_version.text
+    return None
+
+
 def download_authlib(
     raw_version: str,
     minecraft_directory: str,
@@ -269,103 +606,218 @@ def download_authlib(
     launch_account_type: str,
     queue: Queue,
 ):
-    if not no_internet_connection:
-        queue.put(("status", "Загрузка authlib..."))
-        logger.debug(
-            f"Installing authlib in launch, account type: {launch_account_type}"
-        )
-        json_path = os.path.join(
-            minecraft_directory,
-            "versions",
-            raw_version,
-            f"{raw_version}.json",
+    authlib_version = None
+    for lib in versions.load(minecraft_directory, raw_version)["libraries"]:
+        if lib["name"].startswith("com.mojang:authlib:"):
+            authlib_version = lib["name"].split(":")[-1]
+            lib_artifact = lib["downloads"]["artifact"]
+            break
+    if authlib_version is None:
+        queue.put((
+            "show_message",
+            "warning",
+            "Ошибка authlib",
+            "На данной версии нет authlib, скины и авторизация не поддерживаются.",
+        ))
+        logger.warning(
+            f"Warning message showed in download_authlib: skins not supported on {raw_version} version"
         )
+        return
+    if launch_account_type not in ["Ely.by", "Microsoft"]:
+        return
 
-        authlib_version = None
-        with open(json_path, encoding="utf-8") as file_with_downloads:
-            for lib in json.load(file_with_downloads)["libraries"]:
-                if lib["name"].startswith("com.mojang:authlib:"):
-                    authlib_version = lib["name"].split(":")[-1]
-                    lib_artifact = lib["downloads"]["artifact"]
-                    break
-        if authlib_version is not None:
-            if launch_account_type == "Ely.by":
-                base_url = "https://maven.ely.by/releases/by/ely/authlib"
-                with requests.get(f"{base_url}/maven-metadata.xml", timeout=10) as r:
-                    r.raise_for_status()
-                    maven_metadata = r.text
-                for maven_version in ET.fromstring(maven_metadata).findall(
-                    "./versioning/versions/version"
-                )[::-1]:
-                    if authlib_version in maven_version.text:
-                        with open(
-                            os.path.join(
-                                minecraft_directory,
-                                "libraries",
-                                lib_artifact["path"].replace("/", "\\"),
-                            ),
-                            "wb",
-                        ) as jar:
-                            with requests.get(
-                                f"{base_url}/{maven_version.text}/authlib-{maven_version.text}.jar",
-                                timeout=10,
-                            ) as r:
-                                r.raise_for_status()
-                                authlib_jar = r.content
-                            jar.write(authlib_jar)
-                            logger.debug(
-                                f"Installed patched authlib {maven_version.text}"
-                            )
-                        break
-                else:
-                    queue.put((
-                        "show_message",
-                        "warning",
-                        "Ошибка authlib",
-                        "Для данной версии ещё не вышла патченая authlib, обычна она выходит в течении пяти дней после выхода версии.",
-                    ))
-                    logger.warning(
-                        f"Warning message showed in download_authlib: skin error, there is not patched authlib for {raw_version} version"
-                    )
-                    return
-            elif launch_account_type == "Microsoft":
-                with open(
-                    os.path.join(
-                        minecraft_directory,
-                        "libraries",
-                        lib_artifact["path"].replace("/", "\\"),
-                    ),
-                    "wb",
-                ) as jar:
-                    with requests.get(
-                        lib_artifact["url"],
-                        timeout=10,
-                    ) as r:
-                        r.raise_for_status()
-                        authlib_jar = r.content
-                    jar.write(authlib_jar)
-                    logger.debug("Installed original authlib")
+    library_path = os.path.join(
+        minecraft_directory,
+        "libraries",
+        lib_artifact["path"].replace("/", "\\"),
+    )
+    # Both jars of a version are kept, so switching accounts does not
+    # download them again
+    cached_jar_path = os.path.join(
+        Constants.AUTHLIB_CACHE_PATH,
+        launch_account_type,
+        f"authlib-{authlib_version}.jar",
+    )
+    authlib_index = load_authlib_index()
+    cache_key = f"{launch_account_type}/{authlib_version}"
+    expected_sha1 = authlib_index["jars"].get(cache_key, {}).get("sha1")
+    if expected_sha1 is None and launch_account_type == "Microsoft":
+        expected_sha1 = lib_artifact.get("sha1")
+    if expected_sha1 is not None:
+        if (
+            os.path.isfile(library_path)
+            and hash_file(library_path, "sha1") == expected_sha1
+        ):
+            logger.debug(f"Authlib {cache_key} is already in place")
+            return
+        if (
+            os.path.isfile(cached_jar_path)
+            and hash_file(cached_jar_path, "sha1") == expected_sha1
+        ):
+            fileutils.copy_file_atomically(cached_jar_path, library_path)
+            logger.debug(f"Installed authlib {cache_key} from cache")
+            return
+
+    if no_internet_connection:
+        queue.put((
+            "show_message",
+            "warning",
+            "Ошибка authlib",
+            "Отсутсвует подключение к интернету.",
+        ))
+        logger.warning(
+            "Warning message showed in download_authlib: skin error, no internet connection"
+        )
+        return
 
+    queue.put(("status", "Загрузка authlib..."))
+    logger.debug(f"Installing authlib in launch, account type: {launch_account_type}")
+    os.makedirs(os.path.dirname(cached_jar_path), exist_ok=True)
+    if launch_account_type == "Ely.by":
+        base_url = "https://maven.ely.by/releases/by/ely/authlib"
+        maven_version = find_ely_authlib_version(
+            get_ely_maven_metadata(base_url, authlib_index), authlib_version
+        )
+        # A patched authlib may have been released since the metadata was cached
+        if maven_version is None:
+            maven_version = find_ely_authlib_version(
+                get_ely_maven_metadata(base_url, authlib_index, force_refresh=True),
+                authlib_version,
+            )
+        if maven_version is not None:
+            downloads.download(
+                f"{base_url}/{maven_version}/authlib-{maven_version}.jar",
+                cached_jar_path,
+                queue,
+                downloads.PRIORITY_LAUNCH,
+            )
+            logger.debug(f"Installed patched authlib {maven_version}")
         else:
+            save_authlib_index(authlib_index)
             queue.put((
                 "show_message",
                 "warning",
                 "Ошибка authlib",
-                "На данной версии нет authlib, скины и авторизация не поддерживаются.",
+                "Для данной версии ещё не вышла патченая authlib, обычна она выходит в течении пяти дней после выхода версии.",
             ))
             logger.warning(
-                f"Warning message showed in download_authlib: skins not supported on {raw_version} version"
+                f"Warning message showed in download_authlib: skin error, there is not patched authlib for {raw_version} version"
             )
+            return
     else:
-        queue.put((
-            "show_message",
-            "warning",
-            "Ошибка authlib",
-            "Отсутсвует подключение к интернету.",
-        ))
-        logger.warning(
-            "Warning message showed in download_authlib: skin error, no internet connection"
+        downloads.download(
+            lib_artifact["url"],
+            cached_jar_path,
+            queue,
+            downloads.PRIORITY_LAUNCH,
+            lib_artifact.get("size"),
+            {"sha1": lib_artifact["sha1"]} if "sha1" in lib_artifact else None,
         )
+        logger.debug("Installed original authlib")
+    fileutils.copy_file_atomically(cached_jar_path, library_path)
+    authlib_index["jars"][cache_key] = {"sha1": hash_file(cached_jar_path, "sha1")}
+    save_authlib_index(authlib_index)
+
+
+def read_version_folder(
+    versions_path: str, folder_name: str, folder_mtime: int | None
+) -> dict[str, Any]:
+    entry = {
+        "mtime": folder_mtime,
+        "has_json": False,
+        "loader": None,
+        "inherits_from": None,
+        "installed": os.path.isfile(
+            os.path.join(versions_path, folder_name, "installed.FVL")
+        ),
+    }
+    try:
+        entry["inherits_from"] = versions.load_raw(
+            os.path.dirname(versions_path), folder_name
+        ).get("inheritsFrom")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return entry
+    entry["has_json"] = True
+    if entry["inherits_from"] is None:
+        entry["loader"] = "vanilla"
+    else:
+        for loader in Constants.VERSION_LOADERS:
+            if loader in folder_name:
+                entry["loader"] = loader
+                break
+    return entry
+
+
+def build_version_lookup(
+    version_entries: dict[str, dict[str, Any]],
+) -> dict[str, dict[str, str]]:
+    lookup = {"installed": {}, "all": {}}
+    for folder_name in sorted(version_entries, reverse=True):
+        entry = version_entries[folder_name]
+        if not entry["has_json"]:
+            continue
+        # Any folder can be launched by its own name as vanilla, e.g. OptiFine
+        # versions from the other versions list
+        keys = [f"{folder_name}/vanilla"]
+        if entry["loader"] is not None:
+            keys.append(f"{entry['inherits_from'] or folder_name}/{entry['loader']}")
+        for key in keys:
+            lookup["all"].setdefault(key, folder_name)
+            if entry["installed"]:
+                lookup["installed"].setdefault(key, folder_name)
+    return lookup
+
+
+def load_version_index(minecraft_directory: str) -> dict[str, Any]:
+    versions_path = os.path.join(minecraft_directory, "versions")
+    index_key = os.path.abspath(versions_path)
+    try:
+        with open(Constants.VERSION_INDEX_PATH, encoding="utf-8") as index_file:
+            version_indexes = json.load(index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        version_indexes = {}
+    version_index = version_indexes.get(index_key)
+    if (
+        version_index is None
+        or version_index.get("format") != Constants.VERSION_INDEX_FORMAT
+    ):
+        version_index = {
+            "format": Constants.VERSION_INDEX_FORMAT,
+            "mtime": None,
+            "versions": {},
+        }
+    try:
+        versions_mtime = os.stat(versions_path).st_mtime_ns
+    except FileNotFoundError:
+        return {"mtime": None, "versions": {}, "lookup": build_version_lookup({})}
+
+    # The folder list is reread when versions/ changes, and a folder is reread
+    # when its own mtime changes, e.g. after installed.FVL is created
+    changed = False
+    if version_index["mtime"] != versions_mtime:
+        version_index["mtime"] = versions_mtime
+        version_index["versions"] = {
+            folder_name: version_index["versions"].get(folder_name)
+            for folder_name in os.listdir(versions_path)
+            if os.path.isdir(os.path.join(versions_path, folder_name))
+        }
+        changed = True
+    for folder_name, entry in version_index["versions"].items():
+        try:
+            folder_mtime = os.stat(os.path.join(versions_path, folder_name)).st_mtime_ns
+        except FileNotFoundError:
+            folder_mtime = None
+        if entry is None or entry["mtime"] != folder_mtime:
+            version_index["versions"][folder_name] = read_version_folder(
+                versions_path, folder_name, folder_mtime
+            )
+            changed = True
+
+    if changed:
+        version_index["lookup"] = build_version_lookup(version_index["versions"])
+        version_indexes[index_key] = version_index
+        fileutils.write_json_atomically(Constants.VERSION_INDEX_PATH, version_indexes)
+    return version_index
 
 
 def resolve_version_name(
@@ -375,73 +827,41 @@ def resolve_version_name(
     queue: Queue,
     ignore_installed_file: bool = False,
 ) -> tuple[str | None, dict[str, bool | str]]:
-    for v in sorted(
-        minecraft_launcher_lib.utils.get_installed_versions(minecraft_directory),
-        reverse=True,
-        key=lambda s: s["id"],
-    ):
-        folder_name = v["id"]
-        if (
-            os.path.isfile(
-                os.path.join(
-                    minecraft_directory, "versions", folder_name, "installed.FVL"
-                )
-            )
-            or ignore_installed_file
-        ):
-            if mod_loader == "vanilla" and folder_name == version:
-                return folder_name, {}
-            elif mod_loader != "vanilla" and (
-                "forge" not in folder_name if folder_name == "neoforge" else 1
-            ):
-                with open(
-                    os.path.join(
-                        minecraft_directory,
-                        "versions",
-                        folder_name,
-                        f"{folder_name}.json",
-                    ),
-                    encoding="utf-8",
-                ) as version_info:
-                    if (
-                        mod_loader in folder_name
-                        and json.load(version_info)["inheritsFrom"] == version
-                    ):
-                        return folder_name, {}
-    for v in os.listdir(os.path.join(minecraft_directory, "instances")):
-        instance_info_path = os.path.join(
-            minecraft_directory,
-            "instances",
-            v,
-            "instance_info.json",
-        )
-        if version == v and os.path.isfile(instance_info_path):
-            with open(instance_info_path, encoding="utf-8") as instance_info_file:
-                vanilla_version = json.load(instance_info_file)["mc_version"]
-                if resolve_version_name(
-                    vanilla_version, mod_loader, minecraft_directory, queue
-                )[0]:
-                    return vanilla_version, {
-                        "game_directory": os.path.join(
-                            minecraft_directory, "instances", v
-                        )
-                    }
-                elif mod_loader == "vanilla":
-                    queue.put((
-                        "show_message",
-                        "critical",
-                        "Ошибка запуска профиля/сборки",
-                        "Версия игры, которую требует профиль/сборка некорректно установлена. Запуск невозможен.",
-                    ))
-                    return None, {"do_not_install": True}
-                else:
-                    queue.put((
-                        "show_message",
-                        "critical",
-                        "Ошибка запуска профиля/сборки",
-                        'Для запуска сборки/профиля выберите "vanilla" в списке загрузчиков модов',
-                    ))
-                    return None, {"do_not_install": True}
+    folder_name = load_version_index(minecraft_directory)["lookup"][
+        "all" if ignore_installed_file else "installed"
+    ].get(f"{version}/{mod_loader}")
+    if folder_name is not None:
+        return folder_name, {}
+    instance_info_path = os.path.join(
+        minecraft_directory, "instances", version, "instance_info.json"
+    )
+    if os.path.isfile(instance_info_path):
+        with open(instance_info_path, encoding="utf-8") as instance_info_file:
+            vanilla_version = json.load(instance_info_file)["mc_version"]
+            if resolve_version_name(
+                vanilla_version, mod_loader, minecraft_directory, queue
+            )[0]:
+                return vanilla_version, {
+                    "game_directory": os.path.join(
+                        minecraft_directory, "instances", version
+                    )
+                }
+            elif mod_loader == "vanilla":
+                queue.put((
+                    "show_message",
+                    "critical",
+                    "Ошибка запуска профиля/сборки",
+                    "Версия игры, которую требует профиль/сборка некорректно установлена. Запуск невозможен.",
+                ))
+                return None, {"do_not_install": True}
+            else:
+                queue.put((
+                    "show_message",
+                    "critical",
+                    "Ошибка запуска профиля/сборки",
+                    'Для запуска сборки/профиля выберите "vanilla" в списке загрузчиков модов',
+                ))
+                return None, {"do_not_install": True}
     return None, {}
 
 
@@ -454,7 +874,7 @@ def install_version(
     queue: Queue,
     no_internet_connection: bool,
 ):
-    track_progress = track_progress_factory(queue)
+    track_progress = track_progress_factory(queue, downloads.PRIORITY_LAUNCH)
 
     name_of_folder_with_version, other_info = resolve_version_name(
         version, mod_loader, minecraft_directory, queue
@@ -532,37 +952,65 @@ def install_version(
         )
 
 
+def load_optifine_index() -> dict[str, dict[str, Any]]:
+    try:
+        with open(
+            os.path.join(Constants.OPTIFINE_CACHE_PATH, "index.json"), encoding="utf-8"
+        ) as index_file:
+            return json.load(index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_optifine_index(optifine_index: dict[str, dict[str, Any]]):
+    fileutils.write_json_atomically(
+        os.path.join(Constants.OPTIFINE_CACHE_PATH, "index.json"), optifine_index
+    )
+
+
 def download_optifine(
     optifine_path: str,
     raw_version: str,
     queue: Queue,
     no_internet_connection: bool,
 ):
-    if not no_internet_connection:
-        url = None
-        optifine_info = optipy.getVersion(raw_version)
-        if optifine_info is not None:
-            url = optifine_info[raw_version][0]["url"]
-            queue.put(("status", "Загрузка optifine..."))
-            logger.debug("Installing optifine in download_optifine")
-            with (
-                open(optifine_path, "wb") as optifine_jar,
-                requests.get(url, timeout=10) as r,
-            ):
-                r.raise_for_status()
-                optifine_jar.write(r.content)
-            logger.debug(f"Optifine installed, path: {optifine_path}")
-        else:
-            queue.put((
-                "show_message",
-                "warning",
-                "Запуск без optifine",
-                "Optifine недоступен на выбранной вами версии.",
-            ))
-            logger.warning(
-                f"Warning message showed in download_optifine: optifine is not support on {raw_version} version"
+    optifine_index = load_optifine_index()
+    optifine_info = optifine_index.get(raw_version)
+    cached_jar_path = os.path.join(
+        Constants.OPTIFINE_CACHE_PATH, f"OptiFine_{raw_version}.jar"
+    )
+    # optipy scrapes the OptiFine site, so its answer is reused for a while
+    if not no_internet_connection and (
+        optifine_info is None
+        or time.time() - optifine_info["looked_up_at"] > Constants.OPTIFINE_LOOKUP_TTL
+    ):
+        try:
+            optifine_versions = optipy.getVersion(raw_version)
+            optifine_url = (
+                optifine_versions[raw_version][0]["url"]
+                if optifine_versions is not None
+                else None
             )
-    else:
+        except Exception as e:
+            # A network error or a change of the site, the last answer is still
+            # good for the jar in the cache
+            if optifine_info is None:
+                raise
+            logger.debug(
+                f"Failed to look up OptiFine for {raw_version}, using cached: {e}"
+            )
+        else:
+            optifine_info = {
+                **(optifine_info or {}),
+                "url": optifine_url,
+                "looked_up_at": time.time(),
+            }
+            optifine_index[raw_version] = optifine_info
+            save_optifine_index(optifine_index)
+
+    if optifine_info is None or (
+        no_internet_connection and not os.path.isfile(cached_jar_path)
+    ):
         queue.put((
             "show_message",
             "warning",
@@ -572,6 +1020,272 @@ def download_optifine(
         logger.warning(
             "Warning message showed in download_optifine: optifine error, no internet connection"
         )
+    elif optifine_info["url"] is None:
+        queue.put((
+            "show_message",
+            "warning",
+            "Запуск без optifine",
+            "Optifine недоступен на выбранной вами версии.",
+        ))
+        logger.warning(
+            f"Warning message showed in download_optifine: optifine is not support on {raw_version} version"
+        )
+    else:
+        if not no_internet_connection and (
+            optifine_info.get("downloaded_url") != optifine_info["url"]
+            or not os.path.isfile(cached_jar_path)
+        ):
+            queue.put(("status", "Загрузка optifine..."))
+            logger.debug("Installing optifine in download_optifine")
+            try:
+                downloads.download(
+                    optifine_info["url"],
+                    cached_jar_path,
+                    queue,
+                    downloads.PRIORITY_LAUNCH,
+                )
+            except requests.RequestException as e:
+                if not os.path.isfile(cached_jar_path):
+                    raise
+                logger.debug(f"Failed to download OptiFine, using cached jar: {e}")
+            else:
+                optifine_info["downloaded_url"] = optifine_info["url"]
+                save_optifine_index(optifine_index)
+        artifacts.place_artifact(cached_jar_path, optifine_path)
+        logger.debug(f"Optifine installed, path: {optifine_path}")
+
+
+def resolve_launch_paths(minecraft_directory: str, version: str) -> tuple[str, str]:
+    # Resolved offline too, so cached OptiFine and authlib can be used
+    instance_info_path = os.path.join(
+        minecraft_directory, "instances", version, "instance_info.json"
+    )
+    # Only loader versions inherit from another one, so Mojang's version manifest
+    # is not needed to tell them from vanilla ones
+    if os.path.isfile(
+        versions.get_version_json_path(minecraft_directory, version)
+    ) and "inheritsFrom" in versions.load_raw(minecraft_directory, version):
+        raw_version = versions.load_raw(minecraft_directory, version)["inheritsFrom"]
+        optifine_path = os.path.join(minecraft_directory, "mods", "optifine.jar")
+    elif os.path.isfile(instance_info_path):
+        with open(instance_info_path) as instance_info_file:
+            version_with_loader = json.load(instance_info_file)["mc_version"]
+        raw_version = versions.load(minecraft_directory, version_with_loader)[
+            "inheritsFrom"
+        ]
+        optifine_path = os.path.join(
+            minecraft_directory, "instances", version, "mods", "optifine.jar"
+        )
+    else:
+        raw_version = version
+        optifine_path = os.path.join(minecraft_directory, "mods", "optifine.jar")
+    return raw_version, optifine_path
+
+
+def prepare_optifine(
+    minecraft_directory: str,
+    launch_paths: tuple[str, str],
+    optifine: bool,
+    queue: Queue,
+    no_internet_connection: bool,
+):
+    raw_version, optifine_path = launch_paths
+    if not os.path.isdir(os.path.join(minecraft_directory, "mods")):
+        os.mkdir(os.path.join(minecraft_directory, "mods"))
+    if os.path.isfile(optifine_path):
+        os.remove(optifine_path)
+    if optifine:
+        download_optifine(optifine_path, raw_version, queue, no_internet_connection)
+
+
+def get_mtimes(paths: Iterable[str]) -> dict[str, int | None]:
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtimes[path] = None
+    return mtimes
+
+
+def write_argfile(argfile_path: str, arguments: list[str]):
+    # Inside quotes a Java argfile treats backslashes as escapes
+    escaped_arguments = [
+        argument.replace("\\", "\\\\").replace('"', '\\"') for argument in arguments
+    ]
+    # Java reads argfiles in the system encoding (cp1251 on Russian Windows), so
+    # a classpath it can't represent raises UnicodeEncodeError here
+    fileutils.write_file_atomically(
+        argfile_path,
+        "".join(
+            f'"{escaped_argument}"\n' for escaped_argument in escaped_arguments
+        ).encode(locale.getpreferredencoding(False)),
+    )
+
+
+def build_launch_command(
+    version: str, minecraft_directory: str, options: dict[str, Any], cache_key: str
+) -> dict[str, Any]:
+    command = minecraft_launcher_lib.command.get_minecraft_command(
+        version,
+        minecraft_directory,
+        {**options, **Constants.COMMAND_PLACEHOLDERS},
+    )
+    tracked_paths = versions.get_json_paths(minecraft_directory, version)
+    java_major_version = (
+        versions
+        .load(minecraft_directory, version)
+        .get("javaVersion", {})
+        .get("majorVersion", 8)
+    )
+    if os.path.isabs(command[0]):
+        tracked_paths.append(command[0])
+    argfile_path = None
+    for index, argument in enumerate(command[:-1]):
+        if argument in ("-cp", "-classpath"):
+            classpath = command[index + 1]
+            # The "authlib" step swaps the authlib jar for the account type while
+            # the command is built, and the command does not depend on its content
+            authlib_directory = os.path.join(
+                os.path.abspath(minecraft_directory),
+                "libraries",
+                "com",
+                "mojang",
+                "authlib",
+                "",
+            )
+            tracked_paths.extend(
+                path
+                for path in classpath.split(os.pathsep)
+                if not os.path.abspath(path).startswith(authlib_directory)
+            )
+            if java_major_version >= Constants.ARGFILE_MIN_JAVA_VERSION:
+                argfile_path = os.path.abspath(
+                    os.path.join(Constants.COMMAND_CACHE_PATH, f"{cache_key}.args")
+                )
+                try:
+                    write_argfile(argfile_path, [argument, classpath])
+                except UnicodeEncodeError:
+                    logger.debug(
+                        "Classpath can't be written to an argfile, passing it inline"
+                    )
+                    argfile_path = None
+                    break
+                command[index : index + 2] = [f"@{argfile_path}"]
+            break
+    return {
+        "command": command,
+        "argfile": argfile_path,
+        "encoding": locale.getpreferredencoding(False),
+        "mtimes": get_mtimes(tracked_paths),
+    }
+
+
+def get_launch_command(
+    version: str, minecraft_directory: str, options: dict[str, Any]
+) -> list[str]:
+    cache_key = hashlib.sha1(
+        json.dumps(
+            [
+                os.path.abspath(minecraft_directory),
+                version,
+                {
+                    key: value
+                    for key, value in options.items()
+                    if key not in Constants.COMMAND_PLACEHOLDERS
+                },
+            ],
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()
+    cache_path = os.path.join(Constants.COMMAND_CACHE_PATH, f"{cache_key}.json")
+    try:
+        with open(cache_path, encoding="utf-8") as cache_file:
+            cached_command = json.load(cache_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        cached_command = None
+    if (
+        cached_command is not None
+        and cached_command.get("encoding") == locale.getpreferredencoding(False)
+        and get_mtimes(cached_command["mtimes"]) == cached_command["mtimes"]
+        and (
+            cached_command["argfile"] is None
+            or os.path.isfile(cached_command["argfile"])
+        )
+    ):
+        logger.debug(f"Using cached launch command for {version}")
+    else:
+        os.makedirs(Constants.COMMAND_CACHE_PATH, exist_ok=True)
+        cached_command = build_launch_command(
+            version, minecraft_directory, options, cache_key
+        )
+        fileutils.write_json_atomically(cache_path, cached_command)
+
+    command = []
+    for argument in cached_command["command"]:
+        for key, placeholder in Constants.COMMAND_PLACEHOLDERS.items():
+            argument = argument.replace(placeholder, options[key])
+        command.append(argument)
+    return command
+
+
+def select_java_runtime(minecraft_directory: str, version: str) -> str | None:
+    java_version = versions.load(minecraft_directory, version).get("javaVersion", {})
+    # The runtime installed with the version is not in the index until the next
+    # refresh
+    if "component" in java_version:
+        java_path = minecraft_launcher_lib.runtime.get_executable_path(
+            java_version["component"], minecraft_directory
+        )
+        if java_path is not None:
+            logger.debug(
+                f"{java_version['component']} runtime for {version}: {java_path}"
+            )
+            return java_path
+    major_version = java_version.get("majorVersion", runtimes.DEFAULT_MAJOR_VERSION)
+    java_path = runtimes.select_runtime(
+        runtimes.load_index()["runtimes"], major_version
+    )
+    logger.debug(f"Java {major_version} runtime for {version}: {java_path}")
+    return java_path
+
+
+def run_launch_steps(
+    steps: dict[str, tuple[Callable[..., Any], list[str]]],
+) -> dict[str, Any]:
+    # Each step gets the results of its dependencies as arguments and starts as
+    # soon as they are done, so independent steps overlap
+    results = {}
+    started_at = {}
+    pending = dict(steps)
+    launch_started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+        futures = {}
+        while pending or futures:
+            for name, (func, dependencies) in list(pending.items()):
+                if all(dependency in results for dependency in dependencies):
+                    del pending[name]
+                    started_at[name] = time.perf_counter()
+                    futures[
+                        executor.submit(
+                            func, *(results[dependency] for dependency in dependencies)
+                        )
+                    ] = name
+            if not futures:
+                raise ValueError(
+                    f"Launch steps {list(pending)} have unmet dependencies"
+                )
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                results[name] = future.result()
+                logger.debug(
+                    f"Launch step {name} took {time.perf_counter() - started_at[name]:.2f}s"
+                )
+    logger.debug(
+        f"Launch steps took {time.perf_counter() - launch_started_at:.2f}s in total"
+    )
+    return results
 
 
 def launch(
@@ -605,79 +1319,49 @@ def launch(
         version_to_launch, minecraft_directory, options = launch_info
         queue.put(("progressbar", 100))
 
-        if not no_internet_connection:
-            json_path = os.path.join(
-                minecraft_directory, "versions", version, f"{version}.json"
-            )
-            if not minecraft_launcher_lib.utils.is_vanilla_version(
-                version
-            ) and os.path.isfile(json_path):
-                with open(json_path, encoding="utf-8") as file_with_downloads:
-                    raw_version = json.load(file_with_downloads)["inheritsFrom"]
-                    optifine_path = os.path.join(
-                        minecraft_directory, "mods", "optifine.jar"
-                    )
-            elif os.path.isfile(
-                os.path.join(
-                    minecraft_directory, "instances", version, "instance_info.json"
-                )
-            ):
-                with open(
-                    os.path.join(
-                        minecraft_directory,
-                        "instances",
-                        version,
-                        "instance_info.json",
-                    )
-                ) as instance_info_file:
-                    version_with_loader = json.load(instance_info_file)["mc_version"]
-                    with open(
-                        os.path.join(
-                            minecraft_directory,
-                            "versions",
-                            version_with_loader,
-                            f"{version_with_loader}.json",
-                        ),
-                        encoding="utf-8",
-                    ) as file_with_downloads:
-                        raw_version = json.load(file_with_downloads)["inheritsFrom"]
-                        optifine_path = os.path.join(
-                            minecraft_directory,
-                            "instances",
-                            version,
-                            "mods",
-                            "optifine.jar",
-                        )
-            else:
-                raw_version = version
-                optifine_path = os.path.join(
-                    minecraft_directory, "mods", "optifine.jar"
-                )
-        else:
-            raw_version = version
-            optifine_path = os.path.join(minecraft_directory, "mods", "optifine.jar")
-
-        if not os.path.isdir(os.path.join(minecraft_directory, "mods")):
-            os.mkdir(os.path.join(minecraft_directory, "mods"))
-        if os.path.isfile(optifine_path):
-            os.remove(optifine_path)
-        if optifine:
-            download_optifine(optifine_path, raw_version, queue, no_internet_connection)
-        download_authlib(
-            raw_version,
-            minecraft_directory,
-            no_internet_connection,
-            launch_account_type,
-            queue,
-        )
+        results = run_launch_steps({
+            "paths": (lambda: resolve_launch_paths(minecraft_directory, version), []),
+            "optifine": (
+                lambda launch_paths: prepare_optifine(
+                    minecraft_directory,
+                    launch_paths,
+                    optifine,
+                    queue,
+                    no_internet_connection,
+                ),
+                ["paths"],
+            ),
+            "authlib": (
+                lambda launch_paths: download_authlib(
+                    launch_paths[0],
+                    minecraft_directory,
+                    no_internet_connection,
+                    launch_account_type,
+                    queue,
+                ),
+                ["paths"],
+            ),
+            "java": (
+                lambda: select_java_runtime(minecraft_directory, version_to_launch),
+                [],
+            ),
+            "command": (
+                lambda java_path: get_launch_command(
+                    version_to_launch,
+                    minecraft_directory,
+                    options
+                    if java_path is None
+                    else {**options, "executablePath": java_path},
+                ),
+                ["java"],
+            ),
+        })
         logger.debug(f"Launching {version} version")
         popen_kwargs = {}
         if not show_console:
             popen_kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
         minecraft_process = subprocess.Popen(
-            minecraft_launcher_lib.command.get_minecraft_command(
-                version_to_launch, minecraft_directory, options
-            ),
+            results["command"],
             cwd=minecraft_directory,
             **popen_kwargs,
         )
@@ -688,7 +1372,7 @@ def launch(
         queue.put((
             "start_rich_presence",
             "minecraft_opened",
-            raw_version,
+            results["paths"][0],
             minecraft_process.pid,
         ))
         minecraft_return_code = minecraft_process.wait()
@@ -718,36 +1402,651 @@ def mod_loader_is_supported(raw_version: str, mod_loader: str):
         return True
 
 
-def only_project_install(
-    project_version: dict[Any, Any],
-    project_file_path: str,
+def search_modrinth_projects(
+    query: str,
+    game_version: str,
+    loader: str | None,
+    project_type: str | None,
+    offset: int,
+    generation: int,
+    use_catalog: bool,
     queue: Queue,
 ):
-    with requests.get(project_version["url"], stream=True, timeout=10) as r:
-        r.raise_for_status()
-        with open(project_file_path, "wb") as project_file:
-            bytes_downloaded = 0
-            project_size = project_version["size"]
-            chunk_size = int(project_size / 100)
-            for chunk in r.iter_content(chunk_size=chunk_size):
-                if chunk:
-                    bytes_downloaded += chunk_size
-                    queue.put((
-                        "progressbar",
-                        min(100, int(bytes_downloaded / project_size * 100)),
-                    ))
-                    queue.put(("status", f"Загрузка {project_version['title']}"))
-                    project_file.write(chunk)
-    queue_info = [
-        "show_message",
-        "information",
-        "Проект установлен",
-        f"Проект {project_version['title']} был успешно установлен.",
+    local_hits, local_total_hits = [], None
+    try:
+        if use_catalog:
+            local_hits, local_total_hits = catalog.search(
+                query,
+                game_version,
+                loader,
+                project_type,
+                offset,
+                Constants.SEARCH_PAGE_SIZE,
+            )
+            if modrinth.offline:
+                queue.put((
+                    "search_results",
+                    generation,
+                    offset,
+                    local_hits,
+                    local_total_hits,
+                    True,
+                ))
+                return
+            # Shown until the network answers, so typing feels instant
+            if offset == 0 and local_hits:
+                queue.put((
+                    "search_results",
+                    generation,
+                    offset,
+                    local_hits,
+                    local_total_hits,
+                    False,
+                ))
+        facets = []
+        if game_version:
+            facets.append([f"versions:{game_version}"])
+        if loader is not None:
+            facets.append([f"categories:{loader}"])
+        if project_type is not None:
+            facets.append([f"project_type:{project_type}"])
+        params = {
+            "query": query,
+            "offset": offset,
+            "limit": Constants.SEARCH_PAGE_SIZE,
+        }
+        if facets:
+            params["facets"] = json.dumps(facets)
+        try:
+            info = modrinth.get("/search", params)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if not use_catalog:
+                raise
+            logger.debug(f"Using local catalog for search: {e}")
+            queue.put((
+                "search_results",
+                generation,
+                offset,
+                local_hits,
+                local_total_hits,
+                True,
+            ))
+            return
+        if use_catalog:
+            catalog.add_projects(info["hits"])
+        queue.put((
+            "search_results",
+            generation,
+            offset,
+            info["hits"],
+            info["total_hits"],
+            True,
+        ))
+    except Exception:
+        # A final answer lets the window request pages again, the local hits
+        # stay on screen if there were any
+        queue.put((
+            "search_results",
+            generation,
+            offset,
+            local_hits,
+            local_total_hits,
+            True,
+        ))
+        raise
+
+
+def prefetch_project(project: dict[str, Any], thumbnails_cache_size: int, queue: Queue):
+    # Only the icon, version lists of big projects are too heavy to fetch for
+    # every search
+    try:
+        icon_bytes = thumbnails.get_thumbnail(
+            project["icon_url"], 100, thumbnails_cache_size, modrinth.session
+        )
+        thumbnails.save_index()
+    except requests.RequestException as e:
+        logger.debug(f"Failed to prefetch {project['project_id']}: {e}")
+        queue.put(("prefetched_project", project["project_id"], None))
+        return
+    queue.put(("prefetched_project", project["project_id"], {"icon": icon_bytes}))
+
+
+def get_project_file(
+    project_version: dict[str, Any],
+    project_info: dict[str, Any],
+    dependency_type: str | None,
+    primary_project: bool,
+) -> dict[str, Any]:
+    for file in project_version["files"]:
+        if file["primary"]:
+            break
+    else:
+        file = project_version["files"][0]
+    return {
+        **file,
+        "title": project_info["title"],
+        "project_id": project_version["project_id"],
+        "project_type": project_info["project_type"],
+        "primary_project": primary_project,
+        "dependency_type": dependency_type,
+    }
+
+
+def get_latest_project_version(
+    project_id: str, mc_version: str, loader: str
+) -> dict[str, Any] | None:
+    project_versions = modrinth.get(
+        f"/project/{project_id}/version",
+        {
+            "game_versions": json.dumps([mc_version]),
+            "loaders": json.dumps([loader]),
+        },
+    )
+    return project_versions[0] if project_versions else None
+
+
+def resolve_project_files(
+    project: dict[str, Any], mc_version: str, offline: bool, queue: Queue
+):
+    # Module state of the main process is not inherited by this one
+    modrinth.offline = offline
+    queue.put(("status", "Поиск зависимостей"))
+    projects_info = {project["project_id"]: project}
+    loaders_and_files: dict[str, dict[str, dict[str, Any]]] = {}
+    try:
+        project_versions = modrinth.get(
+            f"/project/{project['project_id']}/version",
+            {"game_versions": json.dumps([mc_version])},
+        )
+    except requests.ConnectionError:
+        if not offline:
+            raise
+        queue.put((
+            "show_message",
+            "warning",
+            "Ошибка загрузки",
+            "Отсутствует подключение к интернету, версии проекта не сохранены в кэше.",
+        ))
+        queue.put(("status", ""))
+        logger.warning(
+            f"Warning message showed in resolve_project_files: {project['project_id']} versions are not cached"
+        )
+        return
+    # Every level of the dependency tree is resolved with a few batched requests
+    level = [
+        (loader, project_version, None)
+        for project_version in project_versions
+        for loader in project_version["loaders"]
     ]
-    if project_version["project_type"] == "modpack":
-        queue_info.append(project_file_path)
-    queue.put(queue_info)
-    logger.debug(f"Project {project_version['title']} installed")
+    depth = 0
+    with ThreadPoolExecutor(max_workers=Constants.MODRINTH_LOOKUP_WORKERS) as executor:
+        while level:
+            dependencies = []
+            for loader, project_version, dependency_type in level:
+                loader_files = loaders_and_files.setdefault(loader, {})
+                if project_version["project_id"] in loader_files:
+                    continue
+                loader_files[project_version["project_id"]] = get_project_file(
+                    project_version,
+                    projects_info[project_version["project_id"]],
+                    dependency_type,
+                    depth == 0,
+                )
+                for dependency in project_version["dependencies"]:
+                    if (
+                        dependency.get("dependency_type")
+                        in [
+                            "incompatible",
+                            "embedded",
+                        ]
+                        or dependency.get("project_id") in loader_files
+                    ):
+                        continue
+                    if (
+                        dependency.get("version_id") is not None
+                        or dependency.get("project_id") is not None
+                    ):
+                        dependencies.append((loader, dependency))
+
+            version_ids = list({
+                dependency["version_id"]
+                for _, dependency in dependencies
+                if dependency.get("version_id") is not None
+            })
+            versions_futures = [
+                executor.submit(
+                    modrinth.get,
+                    "/versions",
+                    {
+                        "ids": json.dumps(
+                            version_ids[i : i + Constants.PROJECTS_BATCH_SIZE]
+                        )
+                    },
+                )
+                for i in range(0, len(version_ids), Constants.PROJECTS_BATCH_SIZE)
+            ]
+            # There is no batch endpoint for "latest version for this game
+            # version and loader", so these lookups run concurrently instead
+            latest_versions_futures = {
+                (loader, dependency["project_id"]): executor.submit(
+                    get_latest_project_version,
+                    dependency["project_id"],
+                    mc_version,
+                    loader,
+                )
+                for loader, dependency in dependencies
+                if dependency.get("version_id") is None
+            }
+            fetched_versions = {
+                project_version["id"]: project_version
+                for future in versions_futures
+                for project_version in future.result()
+            }
+            latest_versions = {
+                lookup: future.result()
+                for lookup, future in latest_versions_futures.items()
+            }
+
+            project_ids = list(
+                {
+                    project_version["project_id"]
+                    for project_version in fetched_versions.values()
+                }
+                | {
+                    project_version["project_id"]
+                    for project_version in latest_versions.values()
+                    if project_version is not None
+                }
+                - projects_info.keys()
+            )
+            for project_ids_batch in executor.map(
+                fetch_projects,
+                [
+                    project_ids[i : i + Constants.PROJECTS_BATCH_SIZE]
+                    for i in range(0, len(project_ids), Constants.PROJECTS_BATCH_SIZE)
+                ],
+            ):
+                for project_info in project_ids_batch:
+                    projects_info[project_info["id"]] = project_info
+
+            level = []
+            for loader, dependency in dependencies:
+                if dependency.get("version_id") is not None:
+                    project_version = fetched_versions.get(dependency["version_id"])
+                else:
+                    project_version = latest_versions[
+                        (loader, dependency["project_id"])
+                    ]
+                if (
+                    project_version is not None
+                    and project_version["project_id"] in projects_info
+                ):
+                    level.append((
+                        loader,
+                        project_version,
+                        dependency.get("dependency_type"),
+                    ))
+            depth += 1
+            queue.put(("status", f"Поиск зависимостей (уровень {depth})"))
+    queue.put((
+        "loaders_and_files",
+        {
+            loader: list(loader_files.values())
+            for loader, loader_files in loaders_and_files.items()
+        },
+    ))
+
+
+def install_projects(
+    project_files: list[dict[Any, Any]],
+    minecraft_directory: str,
+    max_workers: int,
+    cancel_event: Event,
+    queue: Queue,
+    job_id: str | None = None,
+    priority: int = downloads.PRIORITY_USER,
+):
+    # The job stays queued until it finishes, so it can be resumed after a
+    # restart if the launcher was closed or crashed meanwhile
+    if job_id is None:
+        job_id = downloads.add_job({
+            "files": project_files,
+            "minecraft_directory": minecraft_directory,
+        })
+
+    def on_file_downloaded(project_file: dict[Any, Any]):
+        queue_info = [
+            "show_message",
+            "information",
+            "Проект установлен",
+            f"Проект {project_file['title']} был успешно установлен.",
+        ]
+        if project_file["project_type"] == "modpack":
+            queue_info.append(project_file["path"])
+        queue.put(queue_info)
+        logger.debug(f"Project {project_file['title']} installed")
+
+    artifacts.install_files(
+        project_files,
+        minecraft_directory,
+        max_workers,
+        queue,
+        cancel_event,
+        on_file_downloaded,
+        priority,
+    )
+    if not (cancel_event.is_set() and downloads.is_paused()):
+        downloads.remove_job(job_id)
+
+
+def resume_downloads(max_workers: int, cancel_event: Event, queue: Queue):
+    for job_id, job in downloads.load_queue().items():
+        if cancel_event.is_set():
+            break
+        install_projects(
+            job["files"],
+            job["minecraft_directory"],
+            max_workers,
+            cancel_event,
+            queue,
+            job_id,
+            downloads.PRIORITY_BACKGROUND,
+        )
+    queue.put(("status", "Загрузки завершены"))
+
+
+def is_library_allowed(library: Mapping[str, Any]) -> bool:
+    # The last rule that matches this system decides, as in the official launcher
+    allowed = "rules" not in library
+    for rule in library.get("rules", ()):
+        os_rule = rule.get("os", {})
+        if "name" in os_rule and os_rule["name"] != Constants.RULE_OS_NAMES.get(
+            platform.system()
+        ):
+            continue
+        if os_rule.get("arch") == "x86" and platform.architecture()[0] != "32bit":
+            continue
+        allowed = rule["action"] == "allow"
+    return allowed
+
+
+def get_download_file(
+    download: Mapping[str, Any] | None, path: str
+) -> dict[str, Any] | None:
+    if not download or not download.get("url") or not download.get("sha1"):
+        return None
+    return {
+        "url": download["url"],
+        "path": path,
+        "size": download.get("size"),
+        "hashes": {"sha1": download["sha1"]},
+    }
+
+
+def get_version_files(
+    minecraft_directory: str, version: str
+) -> tuple[list[dict[str, Any]], dict[str, Any] | None]:
+    version_json = versions.load(minecraft_directory, version)
+    authlib_jars = load_authlib_index()["jars"]
+    files = []
+    for library in version_json.get("libraries", ()):
+        if not is_library_allowed(library):
+            continue
+        library_downloads = library.get("downloads", {})
+        authlib_path = (library_downloads.get("artifact") or {}).get("path")
+        if library["name"].startswith("com.mojang:authlib:") and authlib_path:
+            # download_authlib replaces the jar with the one of the account type,
+            # which never matches the sha1 from the version json
+            authlib_path = os.path.join(
+                minecraft_directory, "libraries", *authlib_path.split("/")
+            )
+            authlib_version = library["name"].split(":")[-1]
+            if os.path.isfile(authlib_path) and hash_file(authlib_path, "sha1") in {
+                jar.get("sha1")
+                for cache_key, jar in authlib_jars.items()
+                if cache_key.endswith(f"/{authlib_version}")
+            }:
+                continue
+        library_artifacts = [library_downloads.get("artifact")]
+        native = library.get("natives", {}).get(
+            Constants.RULE_OS_NAMES.get(platform.system())
+        )
+        if native is not None:
+            library_artifacts.append(
+                library_downloads.get("classifiers", {}).get(
+                    native.replace("${arch}", platform.architecture()[0][:2])
+                )
+            )
+        for artifact in library_artifacts:
+            if artifact is not None and artifact.get("path"):
+                file = get_download_file(
+                    artifact,
+                    os.path.join(
+                        minecraft_directory, "libraries", *artifact["path"].split("/")
+                    ),
+                )
+                if file is not None:
+                    files.append(file)
+
+    # Loader versions run the jar of the vanilla version they inherit from
+    vanilla_version = os.path.basename(
+        os.path.dirname(versions.get_json_paths(minecraft_directory, version)[-1])
+    )
+    client_file = get_download_file(
+        versions
+        .load_raw(minecraft_directory, vanilla_version)
+        .get("downloads", {})
+        .get("client"),
+        os.path.join(
+            minecraft_directory,
+            "versions",
+            vanilla_version,
+            f"{vanilla_version}.jar",
+        ),
+    )
+    if client_file is not None:
+        files.append(client_file)
+
+    asset_index = version_json.get("assetIndex")
+    asset_index_file = None
+    if asset_index is not None:
+        asset_index_file = get_download_file(
+            asset_index,
+            os.path.join(
+                minecraft_directory, "assets", "indexes", f"{asset_index['id']}.json"
+            ),
+        )
+    return files, asset_index_file
+
+
+def get_asset_files(
+    minecraft_directory: str, asset_index_path: str
+) -> list[dict[str, Any]]:
+    with open(asset_index_path, encoding="utf-8") as asset_index_file:
+        asset_objects = json.load(asset_index_file)["objects"]
+    files = {}
+    for asset_object in asset_objects.values():
+        object_hash = asset_object["hash"]
+        files[object_hash] = {
+            "url": f"{Constants.ASSETS_URL}/{object_hash[:2]}/{object_hash}",
+            "path": os.path.join(
+                minecraft_directory, "assets", "objects", object_hash[:2], object_hash
+            ),
+            "size": asset_object.get("size"),
+            "hashes": {"sha1": object_hash},
+        }
+    return list(files.values())
+
+
+def load_verify_index(minecraft_directory: str) -> dict[str, dict[str, Any]]:
+    try:
+        with open(
+            os.path.join(minecraft_directory, Constants.VERIFY_INDEX_FILENAME),
+            encoding="utf-8",
+        ) as verify_index_file:
+            return json.load(verify_index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_verify_index(
+    minecraft_directory: str, verify_index: dict[str, dict[str, Any]]
+):
+    fileutils.write_json_atomically(
+        os.path.join(minecraft_directory, Constants.VERIFY_INDEX_FILENAME),
+        verify_index,
+    )
+
+
+def find_broken_files(
+    files: list[dict[str, Any]],
+    minecraft_directory: str,
+    verify_index: dict[str, dict[str, Any]],
+    cancel_event: Event,
+    queue: Queue,
+) -> list[dict[str, Any]]:
+    def is_file_intact(file: dict[str, Any]) -> bool:
+        if cancel_event.is_set():
+            return True
+        index_key = os.path.relpath(file["path"], minecraft_directory)
+        try:
+            stat = os.stat(file["path"])
+        except FileNotFoundError:
+            verify_index.pop(index_key, None)
+            return False
+        if file.get("size") and stat.st_size != file["size"]:
+            return False
+        # Files are only rehashed when their size or mtime changed
+        file_info = verify_index.get(index_key)
+        if file_info == {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha1": file["hashes"]["sha1"],
+        }:
+            return True
+        if hash_file(file["path"], "sha1") != file["hashes"]["sha1"]:
+            return False
+        verify_index[index_key] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha1": file["hashes"]["sha1"],
+        }
+        return True
+
+    broken_files = []
+    last_progress_update = 0.0
+    with ThreadPoolExecutor(max_workers=Constants.VERIFY_WORKERS) as executor:
+        futures = {executor.submit(is_file_intact, file): file for file in files}
+        for checked_count, future in enumerate(as_completed(futures), 1):
+            if not future.result():
+                broken_files.append(futures[future])
+            if (
+                time.monotonic() - last_progress_update
+                >= downloads.PROGRESS_UPDATE_INTERVAL
+                or checked_count == len(files)
+            ):
+                last_progress_update = time.monotonic()
+                queue.put(("progressbar", checked_count / len(files) * 100))
+                queue.put((
+                    "status",
+                    f"Проверка файлов: {checked_count} из {len(files)}",
+                ))
+    return broken_files
+
+
+def repair_files(
+    files: list[dict[str, Any]],
+    minecraft_directory: str,
+    verify_index: dict[str, dict[str, Any]],
+    max_workers: int,
+    cancel_event: Event,
+    queue: Queue,
+):
+    def on_file_downloaded(file: dict[str, Any]):
+        stat = os.stat(file["path"])
+        verify_index[os.path.relpath(file["path"], minecraft_directory)] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "sha1": file["hashes"]["sha1"],
+        }
+
+    for file in files:
+        os.makedirs(os.path.dirname(file["path"]), exist_ok=True)
+    downloads.download_files(
+        files, max_workers, queue, cancel_event, on_file_downloaded
+    )
+
+
+def verify_version(
+    minecraft_directory: str,
+    version: str,
+    mod_loader: str,
+    max_workers: int,
+    cancel_event: Event,
+    queue: Queue,
+):
+    version_folder = resolve_version_name(
+        version, mod_loader, minecraft_directory, queue
+    )[0]
+    if version_folder is None:
+        queue.put((
+            "show_message",
+            "warning",
+            "Проверка файлов",
+            "Выбранная версия не установлена.",
+        ))
+        return
+
+    verify_index = load_verify_index(minecraft_directory)
+    try:
+        files, asset_index_file = get_version_files(minecraft_directory, version_folder)
+        # Asset objects are listed in the index, so it is repaired first
+        if asset_index_file is not None:
+            repair_files(
+                find_broken_files(
+                    [asset_index_file],
+                    minecraft_directory,
+                    verify_index,
+                    cancel_event,
+                    queue,
+                ),
+                minecraft_directory,
+                verify_index,
+                max_workers,
+                cancel_event,
+                queue,
+            )
+            if cancel_event.is_set():
+                return
+            files += get_asset_files(minecraft_directory, asset_index_file["path"])
+
+        broken_files = find_broken_files(
+            files, minecraft_directory, verify_index, cancel_event, queue
+        )
+        if cancel_event.is_set():
+            return
+        logger.debug(
+            f"{len(broken_files)} of {len(files)} files of {version_folder} are broken"
+        )
+        repair_files(
+            broken_files,
+            minecraft_directory,
+            verify_index,
+            max_workers,
+            cancel_event,
+            queue,
+        )
+    finally:
+        save_verify_index(minecraft_directory, verify_index)
+    if cancel_event.is_set():
+        return
+    queue.put(("progressbar", 100))
+    queue.put((
+        "status",
+        f"Восстановлено файлов: {len(broken_files)}"
+        if broken_files
+        else "Все файлы в порядке",
+    ))
 
 
 def start_rich_presence(
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any
+
+# Parsed version JSONs by path, shared by every stage of a launch
+version_jsons: dict[str, dict[str, Any]] = {}
+version_jsons_lock = threading.RLock()
+
+
+def freeze_json(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze_json(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze_json(item) for item in value)
+    return value
+
+
+def get_library_name_without_version(library: Mapping[str, Any]) -> str:
+    return ":".join(library["name"].split(":")[:-1])
+
+
+def merge_version_json(
+    parent: Mapping[str, Any], child: Mapping[str, Any]
+) -> Mapping[str, Any]:
+    # Same rules as minecraft_launcher_lib's inherit_json: the child's libraries
+    # replace the parent's ones with the same name, lists are prepended and
+    # everything else is overridden
+    child_libraries = {
+        get_library_name_without_version(library)
+        for library in child.get("libraries", ())
+    }
+    merged = dict(parent)
+    merged["libraries"] = (
+        *child.get("libraries", ()),
+        *(
+            library
+            for library in parent.get("libraries", ())
+            if get_library_name_without_version(library) not in child_libraries
+        ),
+    )
+    for key, value in child.items():
+        if key == "libraries":
+            continue
+        if isinstance(value, tuple) and isinstance(merged.get(key), tuple):
+            merged[key] = value + merged[key]
+        elif isinstance(value, Mapping) and isinstance(merged.get(key), Mapping):
+            merged[key] = MappingProxyType({
+                **merged[key],
+                **{
+                    name: merged[key].get(name, ()) + item
+                    for name, item in value.items()
+                    if isinstance(item, tuple)
+                },
+            })
+        else:
+            merged[key] = value
+    return MappingProxyType(merged)
+
+
+def get_version_json_path(minecraft_directory: str, version: str) -> str:
+    return os.path.join(minecraft_directory, "versions", version, f"{version}.json")
+
+
+def load_cached(minecraft_directory: str, version: str) -> dict[str, Any]:
+    json_path = get_version_json_path(minecraft_directory, version)
+    mtime = os.stat(json_path).st_mtime_ns
+    with version_jsons_lock:
+        cached = version_jsons.get(json_path)
+        if cached is None or cached["mtime"] != mtime:
+            with open(json_path, encoding="utf-8") as version_file:
+                cached = {
+                    "mtime": mtime,
+                    "raw": freeze_json(json.load(version_file)),
+                    "parent": None,
+                    "merged": None,
+                }
+            version_jsons[json_path] = cached
+        return cached
+
+
+def load_raw(minecraft_directory: str, version: str) -> Mapping[str, Any]:
+    return load_cached(minecraft_directory, version)["raw"]
+
+
+def load(minecraft_directory: str, version: str) -> Mapping[str, Any]:
+    with version_jsons_lock:
+        cached = load_cached(minecraft_directory, version)
+        if "inheritsFrom" not in cached["raw"]:
+            return cached["raw"]
+        parent = load(minecraft_directory, cached["raw"]["inheritsFrom"])
+        # A reloaded parent is a new object, so the merge is redone
+        if cached["parent"] is not parent:
+            cached["merged"] = merge_version_json(parent, cached["raw"])
+            cached["parent"] = parent
+        return cached["merged"]
+
+
+def get_json_paths(minecraft_directory: str, version: str) -> list[str]:
+    json_paths = []
+    while version is not None:
+        json_paths.append(get_version_json_path(minecraft_directory, version))
+        version = load_raw(minecraft_directory, version).get("inheritsFrom")
+    return json_paths